@@ -7,65 +7,121 @@ import os
 
 from modules import *
 from modules.retry import DataBaseError
+from modules.http_pool import HttpPool
 from modules import utils
-from settings import THREADS, SLEEP_AFTER_ACCOUNT
+from settings import THREADS, MAX_PARKED_ACCOUNTS, SLEEP_AFTER_ACCOUNT, PRESCAN_ACCOUNTS
 
 
 async def run_modules(
         mode: int,
         module_data: dict,
-        sem: asyncio.Semaphore,
 ):
-    async with sem:
-        try:
-            browser = Browser(
-                proxy=module_data["proxy"],
-                encoded_pk=module_data["encoded_privatekey"],
-                address=module_data["address"],
-                db=db,
-            )
-            wallet = Wallet(
-                privatekey=module_data["privatekey"],
-                encoded_pk=module_data["encoded_privatekey"],
-                recipient=module_data["recipient"],
-                db=db,
-            )
-            module_data["module_info"]["status"] = await Linea(wallet=wallet, browser=browser).run()
-
-        except DataBaseError:
-            module_data = None
-            raise
-
-        except Exception as err:
-            logger.error(f'[-] Soft | {wallet.address} | Global error: {err}')
-            await db.append_report(encoded_pk=module_data["encoded_privatekey"], text=str(err), success=False)
-
-        finally:
-            if type(module_data) == dict:
-                await browser.close_sessions()
-                await db.remove_account(module_data)
+    try:
+        browser = Browser(
+            proxy=module_data["proxy"],
+            encoded_pk=module_data["encoded_privatekey"],
+            address=module_data["address"],
+            db=db,
+        )
+        wallet = Wallet(
+            privatekey=db.decode_pk(pk=module_data["encoded_privatekey"]),
+            encoded_pk=module_data["encoded_privatekey"],
+            recipient=module_data["recipient"],
+            db=db,
+        )
+        module_data["module_info"]["status"] = await Linea(wallet=wallet, browser=browser).run()
+
+    except DataBaseError:
+        module_data = None
+        raise
+
+    except Exception as err:
+        logger.error(f'[-] Soft | {module_data["address"]} | Global error: {err}')
+        await db.append_report(encoded_pk=module_data["encoded_privatekey"], text=str(err), success=False)
+
+    finally:
+        if type(module_data) == dict:
+            await db.remove_account(module_data)
+
+            reports = await db.get_account_reports(encoded_pk=module_data["encoded_privatekey"])
+            await TgReport().send_log(logs=reports)
+
+
+async def prescan_accounts():
+    accounts_addresses = db.get_accounts_addresses()
+    logger.info(f'[•] Soft | Pre-scanning {len(accounts_addresses)} accounts...')
+
+    scan_results = await Linea.prescan(addresses=list(set(accounts_addresses.values())))
+    statuses = {"claimable": 0, "claimed": 0, "not eligible": 0}
+    for scan_result in scan_results.values():
+        statuses[scan_result["status"]] += 1
+
+    scan_text = " | ".join(f"{status}: {amount}" for status, amount in statuses.items())
+    logger.info(f'[•] Soft | Pre-scan done: {scan_text}')
+    await TgReport().send_log(logs=f'Pre-scan of {len(accounts_addresses)} accounts\n\n{scan_text}')
+    return scan_results
+
 
+async def feed_accounts(accounts_ids: list, queue: asyncio.Queue, scan_results: dict):
+    skipped = 0
+    for account_id in accounts_ids:
+        module_data = db.get_module_data(account_id)
+        if module_data is None:
+            continue
+
+        if Linea.nothing_to_do(scan_result=scan_results.get(module_data["address"]), recipient=module_data["recipient"]):
+            module_data["module_info"]["status"] = True
+            await db.remove_account(module_data)
+            skipped += 1
+
+            # reports stored before pre-scan (armed claims, previous run) are sent like after a normal run
+            if db.has_reports(encoded_pk=module_data["encoded_privatekey"]):
                 reports = await db.get_account_reports(encoded_pk=module_data["encoded_privatekey"])
                 await TgReport().send_log(logs=reports)
+            continue
+
+        await queue.put(module_data)
+
+    if skipped:
+        logger.info(f'[•] Soft | Skipped {skipped} accounts with nothing to do')
+
+    for _ in range(THREADS + MAX_PARKED_ACCOUNTS):
+        await queue.put(None)
 
-                await utils.async_sleep(randint(*SLEEP_AFTER_ACCOUNT))
+
+async def run_worker(mode: int, queue: asyncio.Queue):
+    while True:
+        module_data = await queue.get()
+        if module_data is None:
+            return
+
+        # accounts start not more often than SLEEP_AFTER_ACCOUNT per thread, parked accounts dont wait for it
+        await Scheduler.pace_start(randint(*SLEEP_AFTER_ACCOUNT) / THREADS)
+        async with Scheduler.slot():
+            await run_modules(mode=mode, module_data=module_data)
 
 
 async def runner(mode: int):
-    all_modules = db.get_all_modules()
-    sem = asyncio.Semaphore(THREADS)
+    accounts_ids = db.get_accounts_ids()
     RPCInitializer(proxies=db.proxies)
+    Scheduler.setup(threads=THREADS)
+
+    if accounts_ids:
+        if mode == 2:
+            # claims are broadcasted together, then accounts continue with after-claim actions as usual
+            await ClaimArmer(db=db).run(accounts_ids=accounts_ids)
+
+        scan_results = await prescan_accounts() if PRESCAN_ACCOUNTS else {}
 
-    if all_modules != 'No more accounts left':
-        await asyncio.gather(*[
-            run_modules(
-                mode=mode,
-                module_data=module_data,
-                sem=sem,
-            )
-            for module_data in all_modules
-        ])
+        queue = asyncio.Queue(maxsize=THREADS)
+        await asyncio.gather(
+            feed_accounts(accounts_ids=accounts_ids, queue=queue, scan_results=scan_results),
+            *[run_worker(mode=mode, queue=queue) for _ in range(THREADS + MAX_PARKED_ACCOUNTS)],
+        )
 
+    await db.close()
+    await HttpPool.close()
+    RPCInitializer.log_stats()
     logger.success(f'All accounts done.')
     return 'Ended'
 
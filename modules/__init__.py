@@ -1,9 +1,11 @@
 # tools
 from .utils import utils, choose_mode, TgReport, WindowName
 from .database import DataBase
+from .scheduler import Scheduler
 from .browser import Browser
 from .wallet import Wallet
 
 # modules
 from .linea import Linea
+from .armer import ClaimArmer
 from .rpc_initializer import RPCInitializer
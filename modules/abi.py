@@ -0,0 +1,111 @@
+from eth_utils import function_abi_to_4byte_selector
+from web3.exceptions import BadFunctionCallOutput
+from web3.auto import w3
+import json
+
+from modules.rpc_initializer import RPCInitializer
+
+
+ABIS = {
+    "erc20": '[{"inputs":[{"internalType":"address","name":"account","type":"address"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"","type":"address"},{"internalType":"uint256","name":"","type":"uint256"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"spender","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"}],"name":"approve","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"address","name":"spender","type":"address"}],"name":"allowance","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"symbol","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"name","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"}],"name":"transfer","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"nonpayable","type":"function"}]',
+    "linea_claim": '[{"inputs":[{"internalType":"address","name":"_account","type":"address"}],"name":"calculateAllocation","outputs":[{"internalType":"uint256","name":"tokenAllocation","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"claim","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"user","type":"address"}],"name":"hasClaimed","outputs":[{"internalType":"bool","name":"claimed","type":"bool"}],"stateMutability":"view","type":"function"}]',
+    "multicall3": '[{"inputs":[{"components":[{"internalType":"address","name":"target","type":"address"},{"internalType":"bool","name":"allowFailure","type":"bool"},{"internalType":"bytes","name":"callData","type":"bytes"}],"internalType":"structMulticall3.Call3[]","name":"calls","type":"tuple[]"}],"name":"aggregate3","outputs":[{"components":[{"internalType":"bool","name":"success","type":"bool"},{"internalType":"bytes","name":"returnData","type":"bytes"}],"internalType":"structMulticall3.Result[]","name":"returnData","type":"tuple[]"}],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"address","name":"addr","type":"address"}],"name":"getEthBalance","outputs":[{"internalType":"uint256","name":"balance","type":"uint256"}],"stateMutability":"view","type":"function"}]',
+}
+
+
+def get_abi_type(param: dict):
+    if param["type"].startswith("tuple"):
+        components = ",".join(get_abi_type(component) for component in param["components"])
+        return f'({components}){param["type"].removeprefix("tuple")}'
+    return param["type"]
+
+
+class FunctionPlan:
+    "everything needed to encode a call and decode its answer, computed once per abi function"
+
+    def __init__(self, func_abi: dict):
+        self.name = func_abi["name"]
+        self.selector = function_abi_to_4byte_selector(func_abi)
+        self.input_types = [get_abi_type(param) for param in func_abi["inputs"]]
+        self.output_types = [get_abi_type(param) for param in func_abi.get("outputs", [])]
+
+
+    def encode(self, args: list):
+        return self.selector + w3.codec.encode(self.input_types, args)
+
+
+    def decode(self, data: bytes):
+        if not self.output_types:
+            return None
+        if not data:
+            raise BadFunctionCallOutput(f'Empty response for {self.name}, probably address is not a contract')
+
+        decoded = w3.codec.decode(self.output_types, data)
+        return decoded[0] if len(self.output_types) == 1 else decoded
+
+
+class AbiContract:
+    def __init__(self, chain_name: str, address: str, abi_name: str):
+        self.chain_name = chain_name
+        self.address = address
+        self.abi_name = abi_name
+
+
+    def get_plan(self, func: str, args_len: int):
+        return AbiRegistry.get_plan(self.abi_name, func, args_len)
+
+
+    def build_tx(self, func: str, *args):
+        "tx dict for Wallet.sent_tx"
+        return {
+            "to": self.address,
+            "data": w3.to_hex(self.get_plan(func, len(args)).encode(list(args))),
+        }
+
+
+    async def call(self, func: str, *args, web3=None):
+        "`web3` to send call in the same provider batch as other reads"
+        plan = self.get_plan(func, len(args))
+        response = await (web3 or RPCInitializer.get_rpc(self.chain_name)).eth.call({
+            "to": self.address,
+            "data": w3.to_hex(plan.encode(list(args))),
+        })
+        return plan.decode(response)
+
+
+class AbiRegistry:
+    abis: dict = {}             # abi name -> parsed abi
+    plans: dict = {}            # (abi name, function name, args amount) -> FunctionPlan
+    contracts: dict = {}        # (chain, address, abi name) -> AbiContract
+
+    @classmethod
+    def get_abi(cls, abi_name: str):
+        if abi_name not in cls.abis:
+            cls.abis[abi_name] = json.loads(ABIS[abi_name])
+        return cls.abis[abi_name]
+
+
+    @classmethod
+    def get_plan(cls, abi_name: str, func: str, args_len: int):
+        plan_key = (abi_name, func, args_len)
+        if plan_key not in cls.plans:
+            func_abi = next((
+                func_abi for func_abi in cls.get_abi(abi_name)
+                if func_abi.get("type") == "function" and func_abi["name"] == func and len(func_abi["inputs"]) == args_len
+            ), None)
+            if func_abi is None:
+                raise ValueError(f'No function {func} with {args_len} args in {abi_name} abi')
+            cls.plans[plan_key] = FunctionPlan(func_abi)
+        return cls.plans[plan_key]
+
+
+    @classmethod
+    def contract(cls, chain_name: str, address: str, abi_name: str):
+        contract_key = (chain_name, address.lower(), abi_name)
+        if contract_key not in cls.contracts:
+            cls.contracts[contract_key] = AbiContract(
+                chain_name=chain_name,
+                address=w3.to_checksum_address(address),
+                abi_name=abi_name,
+            )
+        return cls.contracts[contract_key]
@@ -0,0 +1,202 @@
+from loguru import logger
+from time import time
+import asyncio
+
+from modules.rpc_initializer import RPCInitializer
+from modules.nonce_manager import NonceManager
+from modules.broadcaster import Broadcaster
+from modules.fee_estimator import FeeEstimator
+from modules.gas_limits import GasLimitCache
+from modules.chain_cache import ChainCache
+from modules.database import DataBase
+from modules.abi import AbiRegistry
+from modules.wallet import Wallet
+from modules.linea import Linea
+from settings import GWEI_MULTIPLIER, ARM_MAX_WAIT
+
+
+class ClaimArmer:
+    "claims of all eligible wallets are signed in advance and broadcasted in the first block when claim is open"
+
+    chain_name: str = "linea"
+    default_claim_gas: int = 200_000        # claim cant be estimated before start, unused gas isnt paid
+    not_started_error: str = "0xe450d38c"
+    max_errors: int = 20                    # simulation errors in a row before armed claims are dropped
+
+    def __init__(self, db: DataBase):
+        self.db = db
+        self.armed = []
+
+
+    async def run(self, accounts_ids: list):
+        if not await self.arm(accounts_ids=accounts_ids):
+            logger.info(f'[•] Arm | No claimable accounts to arm')
+            return
+
+        if not await self.wait_for_open():
+            self.disarm()
+            return
+
+        await self.broadcast()
+
+
+    async def arm(self, accounts_ids: list):
+        accounts = [
+            module_data for module_data in
+            [self.db.get_module_data(account_id) for account_id in accounts_ids]
+            if module_data is not None
+        ]
+        scan_results = await Linea.prescan(addresses=list({module_data["address"] for module_data in accounts}), chain_name=self.chain_name)
+        claimable = {}
+        for module_data in accounts:
+            if scan_results.get(module_data["address"], {}).get("status") == "claimable":
+                claimable[module_data["address"]] = module_data
+        if not claimable:
+            return 0
+
+        claim_tx = AbiRegistry.contract(chain_name=self.chain_name, address=Linea.claim_address, abi_name="linea_claim").build_tx("claim")
+        chain_id, fees = await asyncio.gather(*[
+            ChainCache.chain_id(chain_name=self.chain_name),
+            self.estimate_fees(),
+        ])
+        gas_limit = GasLimitCache.get(chain_name=self.chain_name, tx=claim_tx) or self.default_claim_gas
+
+        wallets = [
+            Wallet(
+                privatekey=self.db.decode_pk(pk=module_data["encoded_privatekey"]),
+                encoded_pk=module_data["encoded_privatekey"],
+                recipient=module_data["recipient"],
+                db=self.db,
+            )
+            for module_data in claimable.values()
+        ]
+        nonces = await asyncio.gather(*[
+            NonceManager.allocate(chain_name=self.chain_name, address=wallet.address)
+            for wallet in wallets
+        ])
+
+        for wallet, nonce in zip(wallets, nonces):
+            armed = {
+                "wallet": wallet,
+                "tx": {
+                    **claim_tx,
+                    'from': wallet.address,
+                    'chainId': chain_id,
+                    'nonce': nonce,
+                    'value': 0,
+                    'gas': gas_limit,
+                },
+                "tx_label": f'claim {round(scan_results[wallet.address]["allocation_value"] / 1e18, 1)} LINEA',
+            }
+            self.sign(armed=armed, fees=fees)
+            self.armed.append(armed)
+
+        logger.success(f'[+] Arm | Signed {len(self.armed)} claims ({round(fees["maxFeePerGas"] / 10 ** 9, 3)} gwei), waiting for claim start')
+        return len(self.armed)
+
+
+    async def estimate_fees(self):
+        return await FeeEstimator.estimate(chain_name=self.chain_name, base_multiplier=GWEI_MULTIPLIER, urgency="fast")
+
+
+    def sign(self, armed: dict, fees: dict):
+        armed["tx"].update(fees)
+        signed_tx = armed["wallet"].account.sign_transaction(armed["tx"])
+        armed["raw_tx"] = signed_tx.rawTransaction
+        armed["tx_hash"] = armed["wallet"].get_web3(self.chain_name).to_hex(signed_tx.hash)
+
+
+    async def refresh_fees(self):
+        "fees are followed while waiting, claims are signed again only when fees changed"
+        fees = await self.estimate_fees()
+        if all(self.armed[0]["tx"][fee_key] == fee_value for fee_key, fee_value in fees.items()):
+            return
+
+        for armed in self.armed:
+            self.sign(armed=armed, fees=fees)
+        logger.debug(f'[•] Arm | Claims signed again with {round(fees["maxFeePerGas"] / 10 ** 9, 3)} gwei')
+
+
+    async def wait_for_open(self):
+        "claim is simulated once per block, from the next armed wallet if simulation fails for other reason. False if claim didnt open in time"
+        deadline = time() + ARM_MAX_WAIT * 60 * 60
+        last_block = None
+        armed_index = 0
+        errors = 0
+
+        while time() < deadline:
+            try:
+                block_number = await ChainCache.block_number(chain_name=self.chain_name)
+                if block_number != last_block:
+                    last_block = block_number
+                    armed_tx = self.armed[armed_index % len(self.armed)]["tx"]
+                    simulation, fees_refresh = await asyncio.gather(*[
+                        RPCInitializer.get_rpc(self.chain_name).eth.call({
+                            "from": armed_tx["from"],
+                            "to": armed_tx["to"],
+                            "data": armed_tx["data"],
+                        }),
+                        self.refresh_fees(),
+                    ], return_exceptions=True)
+                    # fees error isnt counted: claims are still signed with the last known fees
+                    if isinstance(fees_refresh, Exception):
+                        logger.warning(f'[-] Arm | Fees refresh error: {fees_refresh}')
+                    if isinstance(simulation, Exception):
+                        raise simulation
+                    logger.success(f'[+] Arm | Claim is open at block {block_number}, broadcasting')
+                    return True
+
+            except Exception as err:
+                if self.not_started_error in str(err):
+                    errors = 0
+                else:
+                    errors += 1
+                    logger.warning(f'[-] Arm | Claim simulation error ({errors}/{self.max_errors}): {err}')
+                    if errors >= self.max_errors:
+                        logger.error(f'[-] Arm | Too many simulation errors, continuing without armed claims')
+                        return False
+                    armed_index += 1
+
+            await asyncio.sleep(ChainCache.block_time(self.chain_name) / 2)
+
+        logger.error(f'[-] Arm | Claim is not open after {ARM_MAX_WAIT} hours, continuing without armed claims')
+        return False
+
+
+    def disarm(self):
+        "armed nonces are never broadcasted, accounts will read them from node in normal flow"
+        for armed in self.armed:
+            NonceManager.resync(chain_name=self.chain_name, address=armed["wallet"].address)
+        self.armed = []
+
+
+    async def broadcast(self):
+        results = await asyncio.gather(*[
+            Broadcaster.send(chain_name=self.chain_name, raw_tx=armed["raw_tx"])
+            for armed in self.armed
+        ], return_exceptions=True)
+
+        sent = []
+        for armed, result in zip(self.armed, results):
+            wallet = armed["wallet"]
+            if isinstance(result, Exception) and "already known" not in str(result).lower():
+                NonceManager.resync(chain_name=self.chain_name, address=wallet.address)
+                logger.error(f'[-] {wallet.address} | Armed {armed["tx_label"]} broadcast error: {result}')
+                await self.db.append_report(
+                    encoded_pk=wallet.encoded_pk,
+                    text=f'armed {armed["tx_label"]} failed: {result}',
+                    success=False,
+                )
+                continue
+
+            wallet.sent_txs[armed["tx_hash"]] = armed["tx"]
+            sent.append(armed)
+
+        logger.info(f'[•] Arm | Broadcasted {len(sent)}/{len(self.armed)} claims')
+        results = await asyncio.gather(*[
+            armed["wallet"].wait_for_tx(chain_name=self.chain_name, tx_hash=armed["tx_hash"], tx_label=armed["tx_label"])
+            for armed in sent
+        ], return_exceptions=True)
+        for armed, result in zip(sent, results):
+            if isinstance(result, Exception):
+                logger.error(f'[-] {armed["wallet"].address} | Armed {armed["tx_label"]} error: {result}')
@@ -0,0 +1,45 @@
+from eth_utils import keccak
+from web3.auto import w3
+import asyncio
+
+from modules.rpc_initializer import RPCInitializer
+from settings import BROADCAST_RPCS
+
+
+class Broadcaster:
+    "same signed tx is pushed to several healthy rpcs at once, first accepted answer wins"
+
+    background: set = set()         # sends which are still running after the first accept
+
+    @classmethod
+    async def send(cls, chain_name: str, raw_tx: bytes):
+        endpoints = RPCInitializer.select_endpoints(chain_name=chain_name, amount=max(BROADCAST_RPCS, 1))
+        tasks = {
+            asyncio.create_task(endpoint.web3.eth.send_raw_transaction(raw_tx)): endpoint
+            for endpoint in endpoints
+        }
+
+        pending = set(tasks)
+        errors = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is None or "already known" in str(error).lower():
+                        tasks[task].broadcasts_won += 1
+                        return w3.to_hex(keccak(raw_tx))
+                    errors.append(error)
+            raise errors[0]
+
+        finally:
+            # other rpcs keep propagating tx, their answers dont matter anymore
+            for task in pending:
+                cls.background.add(task)
+                task.add_done_callback(cls.forget)
+
+
+    @classmethod
+    def forget(cls, task: asyncio.Task):
+        cls.background.discard(task)
+        if not task.cancelled(): task.exception()
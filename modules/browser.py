@@ -1,7 +1,7 @@
-from aiohttp import ClientSession
 from loguru import logger
 
 from modules import DataBase
+from modules.http_pool import HttpPool
 from modules.retry import retry, have_json
 from settings import AFTER_CLAIM
 
@@ -23,28 +23,12 @@ class Browser:
         else:
             logger.opt(colors=True).warning(f'[-] <white>{self.address}</white> | Dont use proxies!')
 
-        self.sessions = []
-        self.session = self.get_new_session()
-
-
-    def get_new_session(self):
-        headers = {
+        self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36",
             "Origin": "https://app.odos.xyz",
             "Referer": "https://app.odos.xyz/",
         }
 
-        session = ClientSession(headers=headers)
-        session.proxy = self.proxy
-
-        self.sessions.append(session)
-        return session
-
-
-    async def close_sessions(self):
-        for session in self.sessions:
-            await session.close()
-
 
     @have_json
     async def send_request(self, **kwargs):
@@ -52,9 +36,11 @@ class Browser:
             session = kwargs["session"]
             del kwargs["session"]
         else:
-            session = self.session
+            # session is shared between all accounts, so headers and proxy go per request
+            session = HttpPool.get_session()
 
         if kwargs.get("method"): kwargs["method"] = kwargs["method"].upper()
+        kwargs["headers"] = {**self.headers, **kwargs.get("headers", {})}
         if self.proxy:
             kwargs["proxy"] = self.proxy
         return await session.request(**kwargs)
@@ -111,7 +97,7 @@ class Browser:
             raise Exception(f"Coudlnt get odos quote: {err}")
 
 
-    async def odos_assemble(self, path_id: str):
+    async def odos_assemble(self, path_id: str, simulate: bool = True):
         try:
             r = await self.send_request(
                 method="POST",
@@ -119,11 +105,14 @@ class Browser:
                 json={
                     "userAddr": self.address,
                     "pathId": path_id,
-                    "simulate": True
+                    "simulate": simulate
                 },
             )
             response = await r.json()
-            if response.get("simulation") is None:
+            if not simulate:
+                if response.get("transaction") is None:
+                    raise Exception(f'bad assemble response {response}')
+            elif response.get("simulation") is None:
                 raise Exception(f'bad assemble response {response}')
             elif response['simulation']['isSuccess'] is not True:
                 if response['simulation']['simulationError']['type'] == "other":
@@ -134,6 +123,7 @@ class Browser:
             return {
                 "data": response['transaction']['data'],
                 "to": response['transaction']['to'],
+                "gas": response['transaction'].get('gas', 0),
             }
 
         except Exception as err:
@@ -0,0 +1,67 @@
+from time import time
+import asyncio
+
+from modules.rpc_initializer import RPCInitializer
+import modules.config as config
+
+
+class ChainCache:
+    "chain-wide reads shared by all wallets: ttl cache + one in-flight request per key"
+
+    values: dict = {}
+    in_flight: dict = {}
+
+    @classmethod
+    async def get(cls, chain_name: str, key: str, fetch, ttl: float | None, web3=None):
+        "ttl=None caches forever, `web3` to send a miss through the same provider batch as other reads"
+
+        cache_key = (chain_name, key)
+        cached = cls.values.get(cache_key)
+        if cached and (cached[0] is None or cached[0] > time()):
+            return cached[1]
+
+        task = cls.in_flight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(cls.fetch(cache_key, fetch, ttl, web3))
+            cls.in_flight[cache_key] = task
+        # shield: one cancelled waiter must not cancel request for everyone else
+        return await asyncio.shield(task)
+
+
+    @classmethod
+    async def fetch(cls, cache_key: tuple, fetch, ttl: float | None, web3=None):
+        try:
+            value = await fetch(web3 or RPCInitializer.get_rpc(cache_key[0]))
+            cls.values[cache_key] = (None if ttl is None else time() + ttl, value)
+            return value
+        finally:
+            cls.in_flight.pop(cache_key, None)
+
+
+    @classmethod
+    def block_time(cls, chain_name: str):
+        return config.CHAINS_DATA.get(chain_name, {}).get("block_time", 2)
+
+
+    @classmethod
+    async def chain_id(cls, chain_name: str, web3=None):
+        async def fetch(web3): return await web3.eth.chain_id
+        return await cls.get(chain_name, "chain_id", fetch, ttl=None, web3=web3)
+
+
+    @classmethod
+    async def gas_price(cls, chain_name: str):
+        async def fetch(web3): return await web3.eth.gas_price
+        return await cls.get(chain_name, "gas_price", fetch, ttl=cls.block_time(chain_name))
+
+
+    @classmethod
+    async def max_priority_fee(cls, chain_name: str, web3=None):
+        async def fetch(web3): return await web3.eth.max_priority_fee
+        return await cls.get(chain_name, "max_priority_fee", fetch, ttl=cls.block_time(chain_name), web3=web3)
+
+
+    @classmethod
+    async def block_number(cls, chain_name: str):
+        async def fetch(web3): return await web3.eth.block_number
+        return await cls.get(chain_name, "block_number", fetch, ttl=cls.block_time(chain_name) / 2)
@@ -1,13 +1,13 @@
 
 CHAINS_DATA = {
-    'ethereum': {'explorer': 'https://etherscan.io/tx/'},
+    'ethereum': {'explorer': 'https://etherscan.io/tx/', 'block_time': 12},
     'base': {'explorer': 'https://basescan.org/tx/'},
     'arbitrum': {'explorer': 'https://arbiscan.io/tx/'},
     'zksync': {'explorer': 'https://era.zksync.network/tx/'},
     'optimism': {'explorer': 'https://optimistic.etherscan.io/tx/'},
     'scroll': {'explorer': 'https://scrollscan.com/tx/'},
     'nova': {'explorer': 'https://nova-explorer.arbitrum.io/tx/'},
-    'linea': {'explorer': 'https://lineascan.build/tx/'},
+    'linea': {'explorer': 'https://lineascan.build/tx/', 'block_time': 2},
     'bsc': {'explorer': 'https://bscscan.com/tx/'},
     'polygon': {'explorer': 'https://polygonscan.com/tx/'},
     'celo': {'explorer': 'https://celoscan.io/tx/'},
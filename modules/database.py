@@ -9,8 +9,10 @@ import asyncio
 import json
 
 from .retry import DataBaseError
+from .storage import get_storage
+from .reports import ReportStore
 from modules import utils, WindowName
-from settings import SHUFFLE_WALLETS, AFTER_CLAIM
+from settings import SHUFFLE_WALLETS, AFTER_CLAIM, DATABASE_ENGINE
 
 from cryptography.fernet import InvalidToken
 
@@ -18,7 +20,7 @@ from cryptography.fernet import InvalidToken
 class DataBase:
     def __init__(self):
 
-        self.modules_db_name = 'databases/modules.json'
+        self.db_folder = 'databases'
         self.report_db_name = 'databases/report.json'
         self.personal_key = None
         self.window_name = None
@@ -26,15 +28,11 @@ class DataBase:
         self.changes_lock = asyncio.Lock()
 
         # create db's if not exists
-        if not path.isdir(self.modules_db_name.split('/')[0]):
-            mkdir(self.modules_db_name.split('/')[0])
+        if not path.isdir(self.db_folder):
+            mkdir(self.db_folder)
 
-        for db_params in [
-            {"name": self.modules_db_name, "value": "[]"},
-            {"name": self.report_db_name, "value": "{}"},
-        ]:
-            if not path.isfile(db_params["name"]):
-                with open(db_params["name"], 'w') as f: f.write(db_params["value"])
+        self.reports = ReportStore(snapshot_name=self.report_db_name, journal_name=f'{self.db_folder}/report.journal')
+        self.storage = get_storage(engine=DATABASE_ENGINE, db_folder=self.db_folder)
 
         with open('input_data/proxies.txt') as f:
             self.proxies = [
@@ -67,10 +65,7 @@ class DataBase:
     def get_password(self):
         if self.personal_key is not None: return
 
-        with open(self.modules_db_name, encoding="utf-8") as f: modules_db = json.load(f)
-        if not modules_db: return
-
-        first_pk = list(modules_db.keys())[0]
+        first_pk = self.storage.first_key()
         if not first_pk: return
         try:
             temp_key = Fernet(urlsafe_b64encode(md5("@karamelniy dumb shit encrypting".encode()).hexdigest().encode()))
@@ -130,7 +125,7 @@ class DataBase:
         else:
             proxies = list(proxies * (len(privatekeys) // len(proxies) + 1))[:len(privatekeys)]
 
-        with open(self.report_db_name, 'w') as f: f.write('{}')  # clear report db
+        self.reports.clear()  # clear report db
 
         new_modules = {
             self.encode_pk(pk): {
@@ -142,109 +137,94 @@ class DataBase:
             for pk, recipient, proxy in zip(privatekeys, recipients, proxies)
         }
 
-        with open(self.modules_db_name, 'w', encoding="utf-8") as f: json.dump(new_modules, f)
+        self.storage.replace(new_modules)
         amounts = self.get_amounts()
         logger.info(f'Created Database for {amounts["accs_amount"]} accounts!\n')
 
 
     def get_amounts(self):
-        with open(self.modules_db_name, encoding="utf-8") as f: modules_db = json.load(f)
-        modules_len = sum([len(modules_db[acc]["modules"]) for acc in modules_db])
-
-        for acc in modules_db:
-            for index, module in enumerate(modules_db[acc]["modules"]):
-                if module["status"] in ["failed", "cloudflare"]: modules_db[acc]["modules"][index]["status"] = "to_run"
-
-        with open(self.modules_db_name, 'w', encoding="utf-8") as f:
-            json.dump(modules_db, f)
+        self.storage.reset_statuses(statuses=["failed", "cloudflare"], new_status="to_run")
+        accs_len, modules_len = self.storage.amounts()
 
-        if self.window_name == None: self.window_name = WindowName(accs_amount=len(modules_db))
-        else: self.window_name.accs_amount = len(modules_db)
+        if self.window_name == None: self.window_name = WindowName(accs_amount=accs_len)
+        else: self.window_name.accs_amount = accs_len
         self.window_name.set_modules(modules_amount=modules_len)
 
         return {
-            'accs_amount': len(modules_db),
+            'accs_amount': accs_len,
             'modules_amount': modules_len,
         }
 
 
-    def get_all_modules(self):
+    def get_accounts_ids(self):
         self.get_password()
-        with open(self.modules_db_name, encoding="utf-8") as f: modules_db = json.load(f)
-
-        if not modules_db:
-            return 'No more accounts left'
-
-        all_wallets_modules = [
-            {
-                'privatekey': self.decode_pk(pk=encoded_privatekey),
-                'encoded_privatekey': encoded_privatekey,
-                'proxy': wallet_data.get("proxy"),
-                'recipient': wallet_data.get("recipient"),
-                'address': wallet_data["address"],
-                'module_info': wallet_data["modules"][0],
-                'last': True
-            }
-            for encoded_privatekey, wallet_data in modules_db.items()
-        ]
+
+        accounts_ids = self.storage.account_ids()
         if SHUFFLE_WALLETS:
-            shuffle(all_wallets_modules)
-        return all_wallets_modules
+            shuffle(accounts_ids)
+        return accounts_ids
+
+
+    def get_accounts_addresses(self):
+        return self.storage.account_addresses()
+
+
+    def get_module_data(self, account_id):
+        "privatekey is not decrypted here, worker decrypts it only when account starts"
+
+        account = self.storage.get_account(account_id)
+        if account is None: return None
+
+        encoded_privatekey, wallet_data = account
+        return {
+            'encoded_privatekey': encoded_privatekey,
+            'proxy': wallet_data.get("proxy"),
+            'recipient': wallet_data.get("recipient"),
+            'address': wallet_data["address"],
+            'module_info': wallet_data["modules"][0],
+            'last': True
+        }
 
 
     async def remove_account(self, module_data: dict):
         async with self.changes_lock:
-            with open(self.modules_db_name, encoding="utf-8") as f: modules_db = json.load(f)
             self.window_name.add_acc()
             if module_data["module_info"]["status"] in [True, "completed"]:
-                del modules_db[module_data["encoded_privatekey"]]
+                self.storage.delete(module_data["encoded_privatekey"])
             else:
-                modules_db[module_data["encoded_privatekey"]]["modules"] = [
-                    {**module, "status": "failed"}
-                    for module in modules_db[module_data["encoded_privatekey"]]["modules"]
-                ]
-
-            with open(self.modules_db_name, 'w', encoding="utf-8") as f:
-                json.dump(modules_db, f)
+                self.storage.set_status(module_data["encoded_privatekey"], "failed")
 
 
     async def append_report(self, encoded_pk: str, text: str, success: bool = None):
-        async with self.changes_lock:
-            status_smiles = {True: '✅ ', False: "❌ ", None: ""}
+        status_smiles = {True: '✅ ', False: "❌ ", None: ""}
+        self.reports.add(encoded_pk=encoded_pk, text=status_smiles[success] + text, success=success)
 
-            with open(self.report_db_name, encoding="utf-8") as f: report_db = json.load(f)
 
-            if not report_db.get(encoded_pk): report_db[encoded_pk] = {'texts': [], 'success_rate': [0, 0]}
-
-            report_db[encoded_pk]["texts"].append(status_smiles[success] + text)
-            if success != None:
-                report_db[encoded_pk]["success_rate"][1] += 1
-                if success == True: report_db[encoded_pk]["success_rate"][0] += 1
-
-            with open(self.report_db_name, 'w') as f: json.dump(report_db, f)
+    def has_reports(self, encoded_pk: str):
+        return bool(self.reports.get(encoded_pk))
 
 
     async def get_account_reports(self, encoded_pk: str, get_rate: bool = False):
-        async with self.changes_lock:
-            with open(self.report_db_name, encoding="utf-8") as f: report_db = json.load(f)
+        decoded_privatekey = self.decode_pk(pk=encoded_pk)
+        account_index = f"[{self.window_name.accs_done}/{self.window_name.accs_amount}]"
+        required_string = f'\n‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾\n{utils.get_ad_tg()}'
 
-            decoded_privatekey = self.decode_pk(pk=encoded_pk)
-            account_index = f"[{self.window_name.accs_done}/{self.window_name.accs_amount}]"
-            required_string = f'\n‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾‾\n{utils.get_ad_tg()}'
+        if self.reports.get(encoded_pk):
+            account_reports = self.reports.get(encoded_pk)
+            if get_rate: return f'{account_reports["success_rate"][0]}/{account_reports["success_rate"][1]}'
+            self.reports.pop(encoded_pk)
 
-            if report_db.get(encoded_pk):
-                account_reports = report_db[encoded_pk]
-                if get_rate: return f'{account_reports["success_rate"][0]}/{account_reports["success_rate"][1]}'
-                del report_db[encoded_pk]
+            logs_text = '\n'.join(account_reports['texts'])
+            tg_text = f'{account_index} <b>{utils.get_address(pk=decoded_privatekey)}</b>\n\n{logs_text}'
+            if account_reports["success_rate"][1]:
+                tg_text += f'\n\nSuccess rate {account_reports["success_rate"][0]}/{account_reports["success_rate"][1]}{required_string}'
 
-                with open(self.report_db_name, 'w', encoding="utf-8") as f: json.dump(report_db, f)
+            return tg_text
 
-                logs_text = '\n'.join(account_reports['texts'])
-                tg_text = f'{account_index} <b>{utils.get_address(pk=decoded_privatekey)}</b>\n\n{logs_text}'
-                if account_reports["success_rate"][1]:
-                    tg_text += f'\n\nSuccess rate {account_reports["success_rate"][0]}/{account_reports["success_rate"][1]}{required_string}'
+        else:
+            return f'{account_index} <b>{utils.get_address(pk=decoded_privatekey)}</b>\n\nNo actions{required_string}'
 
-                return tg_text
 
-            else:
-                return f'{account_index} <b>{utils.get_address(pk=decoded_privatekey)}</b>\n\nNo actions{required_string}'
+    async def close(self):
+        await self.reports.close()
+        self.storage.close()
@@ -0,0 +1,90 @@
+from web3._utils.contract_error_handling import raise_contract_logic_error_on_revert
+from statistics import median
+from web3.auto import w3
+import asyncio
+
+from modules.rpc_initializer import RPCInitializer
+from modules.chain_cache import ChainCache
+
+
+class FeeHistoryEstimator:
+    "EIP-1559 fees from eth_feeHistory: next block base fee + tip percentile of recent blocks"
+
+    history_blocks: int = 10
+    urgency_levels: dict = {        # urgency -> percentile of recent tips
+        "slow": 10,
+        "normal": 50,
+        "fast": 90,
+    }
+
+    @classmethod
+    async def fee_history(cls, chain_name: str, web3=None):
+        "one request per block for all urgency levels and all wallets"
+        async def fetch(web3): return await web3.eth.fee_history(cls.history_blocks, "latest", list(cls.urgency_levels.values()))
+        return await ChainCache.get(chain_name, "fee_history", fetch, ttl=ChainCache.block_time(chain_name), web3=web3)
+
+
+    @classmethod
+    async def estimate(cls, chain_name: str, base_multiplier: float, urgency: str, tx: dict = None, web3=None):
+        fee_history = await cls.fee_history(chain_name=chain_name, web3=web3)
+        percentile_index = list(cls.urgency_levels).index(urgency)
+
+        tips = [block_rewards[percentile_index] for block_rewards in fee_history["reward"] if block_rewards[percentile_index]]
+        if tips:
+            max_priority = int(median(tips))
+        else:
+            # empty blocks dont tell anything about tips
+            max_priority = await ChainCache.max_priority_fee(chain_name=chain_name, web3=web3)
+
+        base_fee = int(fee_history["baseFeePerGas"][-1] * base_multiplier)
+        return {'maxPriorityFeePerGas': max_priority, 'maxFeePerGas': base_fee + max_priority}
+
+
+class LineaFeeEstimator(FeeHistoryEstimator):
+    "tx-specific fees and gas limit from one linea_estimateGas, it also counts L1 data cost. urgency tip is paid if it is higher"
+
+    @classmethod
+    async def estimate(cls, chain_name: str, base_multiplier: float, urgency: str, tx: dict = None, web3=None):
+        if tx is None:
+            return await super().estimate(chain_name=chain_name, base_multiplier=base_multiplier, urgency=urgency, web3=web3)
+
+        linea_estimate, market_fees = await asyncio.gather(*[
+            cls.linea_estimate_gas(chain_name=chain_name, tx=tx, web3=web3),
+            super().estimate(chain_name=chain_name, base_multiplier=base_multiplier, urgency=urgency, web3=web3),
+        ])
+        # linea priority fee is the minimum for this tx to be included
+        max_priority = max(linea_estimate["priorityFeePerGas"], market_fees["maxPriorityFeePerGas"])
+        base_fee = int(linea_estimate["baseFeePerGas"] * base_multiplier)
+        return {
+            'maxPriorityFeePerGas': max_priority,
+            'maxFeePerGas': base_fee + max_priority,
+            'gas': linea_estimate["gasLimit"],
+        }
+
+
+    @classmethod
+    async def linea_estimate_gas(cls, chain_name: str, tx: dict, web3=None):
+        call_params = {
+            key: w3.to_hex(tx[key]) if isinstance(tx[key], int) else tx[key]
+            for key in ["from", "to", "data", "value"]
+            if tx.get(key) is not None
+        }
+        # reverts are raised like in eth_estimateGas, so callers can read custom error selector
+        response = await (web3 or RPCInitializer.get_rpc(chain_name)).manager.coro_request(
+            "linea_estimateGas",
+            [call_params],
+            error_formatters=raise_contract_logic_error_on_revert,
+        )
+        return {key: int(value, 16) if isinstance(value, str) else value for key, value in response.items()}
+
+
+class FeeEstimator:
+    estimators: dict = {            # chain -> estimator, FeeHistoryEstimator for every other chain
+        "linea": LineaFeeEstimator,
+    }
+
+    @classmethod
+    async def estimate(cls, chain_name: str, base_multiplier: float, urgency: str, tx: dict = None, web3=None):
+        "fee params, with `gas` too if estimator got gas limit in the same request"
+        estimator = cls.estimators.get(chain_name, FeeHistoryEstimator)
+        return await estimator.estimate(chain_name=chain_name, base_multiplier=base_multiplier, urgency=urgency, tx=tx, web3=web3)
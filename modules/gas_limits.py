@@ -0,0 +1,67 @@
+from os import path, replace
+from loguru import logger
+import json
+
+
+class GasLimitCache:
+    "gas limits learned from successful receipts: (chain, contract, selector) -> max gas used"
+
+    file_name: str = "databases/gas_limits.json"
+    margin: float = 1.2
+    limits: dict = None         # key -> learned gas used, None while it is tracked but not learned yet
+
+    @classmethod
+    def load(cls):
+        if cls.limits is not None: return
+        cls.limits = {}
+        if path.isfile(cls.file_name):
+            try:
+                with open(cls.file_name) as f:
+                    cls.limits = json.load(f)
+            except Exception as err:
+                logger.warning(f'[-] GasLimitCache | Couldnt load {cls.file_name}: {err}')
+
+
+    @classmethod
+    def save(cls):
+        if not path.isdir(path.dirname(cls.file_name)): return
+        learned = {key: gas_used for key, gas_used in cls.limits.items() if gas_used}
+        with open(f"{cls.file_name}.tmp", "w") as f:
+            json.dump(learned, f)
+        replace(f"{cls.file_name}.tmp", cls.file_name)
+
+
+    @classmethod
+    def get_key(cls, chain_name: str, tx: dict):
+        return f'{chain_name}:{tx["to"].lower()}:{tx.get("data", "0x")[:10].lower()}'
+
+
+    @classmethod
+    def get(cls, chain_name: str, tx: dict):
+        "learned gas limit with margin, tx starts to be tracked if nothing is learned yet"
+        cls.load()
+        key = cls.get_key(chain_name=chain_name, tx=tx)
+        if not cls.limits.get(key):
+            cls.limits[key] = None
+            return None
+        return int(cls.limits[key] * cls.margin)
+
+
+    @classmethod
+    def learn(cls, chain_name: str, tx: dict, gas_used: int):
+        cls.load()
+        key = cls.get_key(chain_name=chain_name, tx=tx)
+        if key not in cls.limits or (cls.limits[key] or 0) >= gas_used: return
+
+        cls.limits[key] = gas_used
+        cls.save()
+
+
+    @classmethod
+    def invalidate(cls, chain_name: str, tx: dict):
+        "reverted tx: next one goes through estimation again"
+        cls.load()
+        key = cls.get_key(chain_name=chain_name, tx=tx)
+        if cls.limits.get(key):
+            cls.limits[key] = None
+            cls.save()
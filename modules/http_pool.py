@@ -0,0 +1,32 @@
+from aiohttp import ClientSession, TCPConnector, DummyCookieJar
+
+
+class HttpPool:
+    "one process-wide keep-alive session, proxy goes per request so connections are pooled per (host, proxy) in one bounded connector"
+
+    session: ClientSession = None
+    limit: int = 200                # connections in use over all hosts and proxies
+    limit_per_host: int = 20
+    keepalive_timeout: int = 60
+    dns_cache_ttl: int = 300
+
+    @classmethod
+    def get_session(cls):
+        if cls.session is None or cls.session.closed:
+            cls.session = ClientSession(
+                connector=TCPConnector(
+                    limit=cls.limit,
+                    limit_per_host=cls.limit_per_host,
+                    keepalive_timeout=cls.keepalive_timeout,
+                    ttl_dns_cache=cls.dns_cache_ttl,
+                ),
+                cookie_jar=DummyCookieJar(),
+            )
+        return cls.session
+
+
+    @classmethod
+    async def close(cls):
+        session, cls.session = cls.session, None
+        if session is not None:
+            await session.close()
@@ -1,11 +1,14 @@
 from random import randint
 from loguru import logger
+import asyncio
 
-from modules.rpc_initializer import RPCInitializer
+from modules.abi import AbiRegistry
 from modules.retry import retry, TransactionError
+from modules.nonce_manager import NonceManager
+from modules.chain_cache import ChainCache
 from modules.config import TOKEN_ADDRESSES
 from modules.multicall import MultiCall
-from modules.utils import async_sleep
+from modules.scheduler import Scheduler
 from modules.browser import Browser
 from modules.wallet import Wallet
 from modules.odos import Odos
@@ -13,6 +16,7 @@ from settings import SLEEP_AFTER_TX, AFTER_CLAIM
 
 
 class Linea:
+    claim_address: str = "0x87bAa1694381aE3eCaE2660d97fe60404080Eb64"
 
     def __init__(self, wallet: Wallet, browser: Browser):
         self.wallet = wallet
@@ -26,25 +30,7 @@ class Linea:
     async def run(self):
         to_sleep = False
 
-        claim_contract = RPCInitializer.initialize_contract(
-            chain_name=self.from_chain,
-            address="0x87bAa1694381aE3eCaE2660d97fe60404080Eb64",
-            abi='[{"inputs":[{"internalType":"address","name":"_account","type":"address"}],"name":"calculateAllocation","outputs":[{"internalType":"uint256","name":"tokenAllocation","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"claim","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"user","type":"address"}],"name":"hasClaimed","outputs":[{"internalType":"bool","name":"claimed","type":"bool"}],"stateMutability":"view","type":"function"}]',
-        )
-
-        call_data = {
-            "allocation_value": {
-                "contract": claim_contract,
-                "func": "calculateAllocation",
-                "args": [self.wallet.address]
-            },
-            "is_claimed": {
-                "contract": claim_contract,
-                "func": "hasClaimed",
-                "args": [self.wallet.address]
-            },
-        }
-        call_resp = await MultiCall.call(chain_name=self.from_chain, call_data=call_data)
+        call_resp = await self.preflight()
         call_resp["allocation_amount"] = round(call_resp["allocation_value"] / 1e18, 1)
 
         if call_resp["allocation_value"] == 0:
@@ -71,16 +57,18 @@ class Linea:
                 success=True,
             )
 
+            claim_contract = AbiRegistry.contract(chain_name=self.from_chain, address=self.claim_address, abi_name="linea_claim")
             claim_status = await self.claim(value=call_resp["allocation_value"], contract=claim_contract)
             if claim_status is False:
                 return False
+            call_resp["linea_value"] += call_resp["allocation_value"]
             to_sleep = True
 
-        linea_value = await self.wallet.get_balance(chain_name=self.from_chain, token_name="LINEA")
+        linea_value = call_resp["linea_value"]
         if linea_value:
             if AFTER_CLAIM["swap"]:
                 if to_sleep:
-                    await async_sleep(randint(*SLEEP_AFTER_TX))
+                    await Scheduler.park(randint(*SLEEP_AFTER_TX))
 
                 await self.wallet.wait_for_gwei()
                 await Odos(
@@ -92,37 +80,70 @@ class Linea:
                         "chain": self.from_chain,
                         "value": linea_value,
                         "amount": linea_value / 1e18,
+                        "allowance": call_resp["odos_allowance"],
                     }
                 ).prepare_swap()
                 to_sleep = True
 
             elif AFTER_CLAIM["send_token"]:
                 if to_sleep:
-                    await async_sleep(randint(*SLEEP_AFTER_TX))
+                    await Scheduler.park(randint(*SLEEP_AFTER_TX))
                 await self.wallet.wait_for_gwei()
                 await self.wallet.transfer_token(chain_name=self.from_chain, token_name="LINEA", value=linea_value)
                 to_sleep = True
 
         if AFTER_CLAIM["send_eth"] and self.wallet.recipient:
             if to_sleep:
-                await async_sleep(randint(*SLEEP_AFTER_TX))
+                await Scheduler.park(randint(*SLEEP_AFTER_TX))
             await self.wallet.wait_for_gwei()
-            await self.wallet.transfer_native(chain_name=self.from_chain)
+            await self.wallet.transfer_native(
+                chain_name=self.from_chain,
+                balance=call_resp["eth_value"] if not to_sleep else None,   # snapshot is actual only if no tx was sent
+            )
 
         return True
 
 
+    async def preflight(self):
+        "account state in one batch: claim state, balances, odos allowance if router is known, and pending nonce"
+
+        claim_contract = AbiRegistry.contract(chain_name=self.from_chain, address=self.claim_address, abi_name="linea_claim")
+        token_contract = AbiRegistry.contract(chain_name=self.from_chain, address=TOKEN_ADDRESSES[self.from_chain]["LINEA"], abi_name="erc20")
+        multicall_contract = AbiRegistry.contract(chain_name=self.from_chain, address=MultiCall.multicall_address, abi_name="multicall3")
+
+        call_data = {
+            "allocation_value": {"contract": claim_contract, "func": "calculateAllocation", "args": [self.wallet.address]},
+            "is_claimed": {"contract": claim_contract, "func": "hasClaimed", "args": [self.wallet.address]},
+            "linea_value": {"contract": token_contract, "func": "balanceOf", "args": [self.wallet.address]},
+            "eth_value": {"contract": multicall_contract, "func": "getEthBalance", "args": [self.wallet.address]},
+        }
+        # odos api isnt called before claim: router is known after the first swap, until then approve reads allowance itself
+        odos_router = Odos.routers.get(await ChainCache.chain_id(chain_name=self.from_chain)) if AFTER_CLAIM["swap"] else None
+        if odos_router:
+            call_data["odos_allowance"] = {"contract": token_contract, "func": "allowance", "args": [self.wallet.address, odos_router]}
+
+        # same web3 for both, so provider sends them as one batch request
+        web3 = self.wallet.get_web3(self.from_chain)
+        call_resp, _ = await asyncio.gather(*[
+            MultiCall.call(chain_name=self.from_chain, call_data=call_data, web3=web3),
+            NonceManager.prefetch(chain_name=self.from_chain, address=self.wallet.address, web3=web3),
+        ])
+        call_resp.setdefault("odos_allowance", None)
+        return call_resp
+
+
     async def claim(self, value: int, contract):
         amount = round(value / 1e18, 1)
         tx_label = f"claim {amount} LINEA"
 
-        tx = contract.functions.claim()
+        tx = contract.build_tx("claim")
 
         try:
             await self.wallet.sent_tx(
                 chain_name=self.from_chain,
                 tx=tx,
                 tx_label=tx_label,
+                cache_gas=True,
             )
         except TransactionError as err:
             if err.error_code.startswith("0xe450d38c"):
@@ -139,6 +160,50 @@ class Linea:
         return True
 
 
+    @classmethod
+    async def prescan(cls, addresses: list, chain_name: str = "linea"):
+        "classify accounts without opening their sessions: `not eligible` / `claimed` / `claimable`"
+
+        claim_contract = AbiRegistry.contract(chain_name=chain_name, address=cls.claim_address, abi_name="linea_claim")
+        token_contract = AbiRegistry.contract(chain_name=chain_name, address=TOKEN_ADDRESSES[chain_name]["LINEA"], abi_name="erc20")
+
+        call_data = {}
+        for address in addresses:
+            call_data[f"{address}:allocation"] = {"contract": claim_contract, "func": "calculateAllocation", "args": [address]}
+            call_data[f"{address}:claimed"] = {"contract": claim_contract, "func": "hasClaimed", "args": [address]}
+            call_data[f"{address}:balance"] = {"contract": token_contract, "func": "balanceOf", "args": [address]}
+        call_resp = await MultiCall.call(chain_name=chain_name, call_data=call_data, allow_partial=True)
+
+        scan_results = {}
+        for address in addresses:
+            if any(f"{address}:{call_key}" not in call_resp for call_key in ["allocation", "claimed", "balance"]):
+                continue  # chunk failed, account will be checked by itself
+
+            allocation_value = call_resp[f"{address}:allocation"]
+            if allocation_value == 0: status = "not eligible"
+            elif call_resp[f"{address}:claimed"]: status = "claimed"
+            else: status = "claimable"
+
+            scan_results[address] = {
+                "status": status,
+                "allocation_value": allocation_value,
+                "linea_value": call_resp[f"{address}:balance"],
+            }
+
+        return scan_results
+
+
+    @classmethod
+    def nothing_to_do(cls, scan_result: dict | None, recipient: str | None):
+        if scan_result is None or scan_result["status"] == "claimable":
+            return False
+        if scan_result["linea_value"] and (AFTER_CLAIM["swap"] or AFTER_CLAIM["send_token"]):
+            return False
+        if AFTER_CLAIM["send_eth"] and recipient:
+            return False
+        return True
+
+
     def log_message(
             self,
             text: str,
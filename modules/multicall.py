@@ -1,29 +1,111 @@
 from eth_typing.evm import Address
-from web3.auto import w3
+from loguru import logger
+import asyncio
 
-from modules.rpc_initializer import RPCInitializer
+from modules.abi import AbiRegistry
 
 
 class MultiCall:
     multicall_address: Address = "0xcA11bde05977b3631167028862bE2a173976CA11"
-    multicall_abi: str = '[{"inputs":[{"components":[{"internalType":"address","name":"target","type":"address"},{"internalType":"bool","name":"allowFailure","type":"bool"},{"internalType":"bytes","name":"callData","type":"bytes"}],"internalType":"structMulticall3.Call3[]","name":"calls","type":"tuple[]"}],"name":"aggregate3","outputs":[{"components":[{"internalType":"bool","name":"success","type":"bool"},{"internalType":"bytes","name":"returnData","type":"bytes"}],"internalType":"structMulticall3.Result[]","name":"returnData","type":"tuple[]"}],"stateMutability":"payable","type":"function"},{"inputs":[{"internalType":"address","name":"addr","type":"address"}],"name":"getEthBalance","outputs":[{"internalType":"uint256","name":"balance","type":"uint256"}],"stateMutability":"view","type":"function"}]'
+
+    max_calls: int = 500                    # calls in one aggregate3
+    max_response_size: int = 150_000        # estimated bytes of return data in one aggregate3
+    max_parallel: int = 4                   # chunks in flight at the same time
+    chunk_retries: int = 3
+    split_errors = ["out of gas", "gas limit", "gas required", "too large", "response size", "timeout", "timed out", "413", "payload"]
+
+    @classmethod
+    async def call(cls, chain_name: str, call_data: dict, allow_partial: bool = False, **kwargs):
+        "big call_data is split into chunks which are sent in parallel, `allow_partial` drops keys of failed chunks instead of raising"
+
+        semaphore = asyncio.Semaphore(cls.max_parallel)
+        chunks_results = await asyncio.gather(*[
+            cls.call_chunk(
+                chain_name=chain_name,
+                call_data=call_data,
+                keys=chunk,
+                semaphore=semaphore,
+                allow_partial=allow_partial,
+                **kwargs
+            )
+            for chunk in cls.split_chunks(call_data)
+        ])
+
+        merged_result = {}
+        for chunk_result in chunks_results:
+            merged_result.update(chunk_result)
+        return {key: merged_result[key] for key in call_data if key in merged_result}
+
 
     @classmethod
-    async def call(cls, chain_name: str, call_data: dict, **kwargs):
-        contract = RPCInitializer.initialize_contract(
-            chain_name=chain_name,
-            address=cls.multicall_address,
-            abi=cls.multicall_abi
-        )
-
-        call_response = await contract.functions.aggregate3([
+    def split_chunks(cls, call_data: dict):
+        chunks = [[]]
+        chunk_size = 0
+        for key in call_data:
+            call_size = cls.estimate_response_size(call_data[key])
+            if chunks[-1] and (len(chunks[-1]) >= cls.max_calls or chunk_size + call_size > cls.max_response_size):
+                chunks.append([])
+                chunk_size = 0
+            chunks[-1].append(key)
+            chunk_size += call_size
+        return [chunk for chunk in chunks if chunk]
+
+
+    @classmethod
+    def estimate_response_size(cls, token_data: dict):
+        # 64 bytes of Result(success, offset) + 32 bytes for every static word, dynamic types are guessed
+        size = 64
+        for abi_type in cls.get_plan(token_data).output_types:
+            size += 128 if abi_type in ["string", "bytes"] or abi_type.endswith("]") else 32
+        return size
+
+
+    @classmethod
+    async def call_chunk(
+            cls,
+            chain_name: str,
+            call_data: dict,
+            keys: list,
+            semaphore: asyncio.Semaphore,
+            allow_partial: bool,
+            **kwargs
+    ):
+        for attempt in range(1, cls.chunk_retries + 1):
+            try:
+                async with semaphore:
+                    return await cls.aggregate(chain_name, {key: call_data[key] for key in keys}, **kwargs)
+
+            except Exception as err:
+                too_big = isinstance(err, asyncio.TimeoutError) or any(split_error in str(err).lower() for split_error in cls.split_errors)
+                if len(keys) > 1 and too_big:
+                    # response is too big for this rpc, retry only this chunk by halves
+                    halves = await asyncio.gather(*[
+                        cls.call_chunk(chain_name, call_data, half, semaphore, allow_partial, **kwargs)
+                        for half in [keys[:len(keys) // 2], keys[len(keys) // 2:]]
+                    ])
+                    return {**halves[0], **halves[1]}
+
+                if attempt == cls.chunk_retries:
+                    if allow_partial:
+                        logger.warning(f'[-] MultiCall | Chunk of {len(keys)} calls failed: {err}')
+                        return {}
+                    raise
+                await asyncio.sleep(1)
+
+
+    @classmethod
+    async def aggregate(cls, chain_name: str, call_data: dict, **kwargs):
+        # every attempt selects an endpoint again, so chunks go to different rpcs. `web3` kwarg pins one to batch with other reads
+        contract = AbiRegistry.contract(chain_name=chain_name, address=cls.multicall_address, abi_name="multicall3")
+
+        call_response = await contract.call("aggregate3", [
             [
                 call_data[k]["contract"].address,
                 True,
-                call_data[k]["contract"].functions[call_data[k]["func"]](*call_data[k]["args"])._encode_transaction_data()
+                cls.get_plan(call_data[k]).encode(call_data[k]["args"])
             ]
             for k in call_data
-        ]).call()
+        ], web3=kwargs.get("web3"))
 
         call_result = {}
         for token_name, resp in zip(call_data, call_response):
@@ -32,27 +114,18 @@ class MultiCall:
                 if kwargs.get("decimals") and "int" in str(abi_types[0]):
                     readable_response /= 10 ** kwargs["decimals"]
             else:
-                readable_response = 0
+                readable_response = kwargs.get("failed_value", 0)
             call_result[token_name] = readable_response
 
         return call_result
 
 
+    @classmethod
+    def get_plan(cls, token_data: dict):
+        return token_data["contract"].get_plan(token_data["func"], len(token_data["args"]))
+
+
     @classmethod
     def decode_resp(cls, token_data: dict, resp: bytes):
-        for _func in token_data["contract"].abi:
-            if _func["name"] == token_data["func"]:
-                abi_types = []
-                for func in _func["outputs"]:
-                    if func["type"] == "tuple" and func.get("components"):
-                        abi_types += [comp["type"] for comp in func["components"]]
-                    else:
-                        abi_types.append(func["type"])
-                break
-
-        if len(abi_types) == 1:
-            readable_response = w3.codec.decode(abi_types, resp)[0]
-        else:
-            readable_response = w3.codec.decode(abi_types, resp)
-
-        return readable_response, abi_types
+        plan = cls.get_plan(token_data)
+        return plan.decode(resp), plan.output_types
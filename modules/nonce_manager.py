@@ -0,0 +1,58 @@
+import asyncio
+
+from modules.rpc_initializer import RPCInitializer
+
+
+class NonceManager:
+    "local nonce for every (chain, address): read once from pending nonce, then given out without rpc calls"
+
+    nonces: dict = {}           # (chain, address) -> next nonce to give out
+    locks: dict = {}            # (chain, address) -> asyncio.Lock
+    resync_errors = ["nonce too low", "already known", "known transaction", "replacement transaction underpriced"]
+
+    @classmethod
+    def get_lock(cls, key: tuple):
+        if key not in cls.locks:
+            cls.locks[key] = asyncio.Lock()
+        return cls.locks[key]
+
+
+    @classmethod
+    async def allocate(cls, chain_name: str, address: str, web3=None):
+        key = (chain_name, address)
+        async with cls.get_lock(key):
+            if key not in cls.nonces:
+                cls.nonces[key] = await (web3 or RPCInitializer.get_rpc(chain_name)).eth.get_transaction_count(address, "pending")
+            nonce = cls.nonces[key]
+            cls.nonces[key] += 1
+            return nonce
+
+
+    @classmethod
+    async def prefetch(cls, chain_name: str, address: str, web3=None):
+        "read pending nonce ahead, so the first tx doesnt wait for it"
+        key = (chain_name, address)
+        async with cls.get_lock(key):
+            if key not in cls.nonces:
+                cls.nonces[key] = await (web3 or RPCInitializer.get_rpc(chain_name)).eth.get_transaction_count(address, "pending")
+
+
+    @classmethod
+    def release(cls, chain_name: str, address: str, nonce: int):
+        "tx with this nonce was not broadcasted"
+        key = (chain_name, address)
+        if cls.nonces.get(key) == nonce + 1:
+            cls.nonces[key] = nonce
+        else:
+            # some later nonce is already given out, let the node tell where the gap is
+            cls.resync(chain_name=chain_name, address=address)
+
+
+    @classmethod
+    def resync(cls, chain_name: str, address: str):
+        cls.nonces.pop((chain_name, address), None)
+
+
+    @classmethod
+    def is_nonce_error(cls, err: Exception):
+        return any(resync_error in str(err).lower() for resync_error in cls.resync_errors)
@@ -1,9 +1,14 @@
+from loguru import logger
+
 from modules.wallet import Wallet
 from modules.browser import Browser
+from modules.chain_cache import ChainCache
 from modules.config import CHAIN_TOKENS
 
 
 class Odos:
+    routers: dict = {}          # chain id -> odos router address
+
     def __init__(self, wallet: Wallet, browser: Browser, token_data: dict):
         self.wallet = wallet
         self.browser = browser
@@ -19,9 +24,16 @@ class Odos:
         }
 
 
+    @classmethod
+    async def get_router(cls, browser: Browser, chain_id: int):
+        if chain_id not in cls.routers:
+            cls.routers[chain_id] = await browser.odos_get_contract(chain_id=chain_id)
+        return cls.routers[chain_id]
+
+
     async def prepare_swap(self):
-        self.chain_id = await self.web3.eth.chain_id
-        odos_contract = await self.browser.odos_get_contract(chain_id=self.chain_id)
+        self.chain_id = await ChainCache.chain_id(chain_name=self.token_data["chain"])
+        odos_contract = await self.get_router(browser=self.browser, chain_id=self.chain_id)
 
         odos_quote = await self.browser.odos_quote(
             token_address=self.token_data["address"],
@@ -30,37 +42,56 @@ class Odos:
             token_output=self.token_output["address"]
         )
 
-        await self.wallet.approve(
+        pending_txs = await self.wallet.approve(
             chain_name=self.token_data["chain"],
             token_name=self.token_data["symbol"],
             spender=odos_contract,
-            value=self.token_data["value"]
+            value=self.token_data["value"],
+            wait=False,
+            allowance=self.token_data.get("allowance"),
         )
 
-        status = await self.swap(odos_quote=odos_quote)
+        status = await self.swap(odos_quote=odos_quote, pending_txs=pending_txs or {})
         if type(status) == bool: return status
 
 
-    async def swap(self, odos_quote: dict):
+    async def swap(self, odos_quote: dict, pending_txs: dict):
+        "swap is signed with the next nonce right after approve, both txs are confirmed together"
+
         tx_label = f'{self.token_data["chain"].upper()} odos swap {round(self.token_data["amount"], 2)} ' \
                      f'{self.token_data["symbol"]} -> {round(odos_quote["amount_out"], 6)} {self.token_output["name"]}'
         try:
-            odos_tx = await self.browser.odos_assemble(path_id=odos_quote["path_id"])
+            # swap cant be simulated or estimated until approve is mined, odos gas estimate is used instead
+            odos_tx = await self.browser.odos_assemble(path_id=odos_quote["path_id"], simulate=not pending_txs)
+            if pending_txs and int(odos_tx["gas"]) <= 0:
+                approve_txs, pending_txs = pending_txs, {}
+                await self.wallet.wait_for_txs(chain_name=self.token_data["chain"], txs=approve_txs)
+                odos_tx = await self.browser.odos_assemble(path_id=odos_quote["path_id"])
+
             tx = {
                 'from': self.wallet.address,
                 'to': odos_tx["to"],
                 'data': odos_tx["data"],
                 'chainId': self.chain_id,
-                'nonce': await self.web3.eth.get_transaction_count(self.wallet.address),
             }
 
-            await self.wallet.sent_tx(
+            swap_hash = await self.wallet.sent_tx(
                 chain_name=self.token_data["chain"],
                 tx=tx,
                 tx_label=tx_label,
-                tx_raw=True
+                tx_raw=True,
+                force_gas=int(int(odos_tx["gas"]) * 1.2) if pending_txs else 0,
+                wait=False,
             )
+            sent_txs, pending_txs = {**pending_txs, swap_hash: tx_label}, {}
+            await self.wallet.wait_for_txs(chain_name=self.token_data["chain"], txs=sent_txs)
             return True
 
         except Exception as error:
+            if pending_txs:
+                # approve is already broadcasted: it is confirmed and reported anyway, so retry reads its allowance
+                try:
+                    await self.wallet.wait_for_txs(chain_name=self.token_data["chain"], txs=pending_txs)
+                except Exception as err:
+                    logger.warning(f'[-] {self.wallet.address} | Approve for {tx_label} error: {err}')
             raise ValueError(f'{tx_label}: {error}')
@@ -0,0 +1,121 @@
+from web3._utils.encoding import FriendlyJsonSerde, Web3JsonEncoder
+from aiohttp import ClientTimeout
+from web3 import AsyncHTTPProvider
+from eth_utils import to_bytes
+import asyncio
+
+from modules.http_pool import HttpPool
+from settings import RPC_BATCHING
+
+
+class PooledHTTPProvider(AsyncHTTPProvider):
+    "AsyncHTTPProvider which sends requests through the shared HttpPool session and packs concurrent calls into batches"
+
+    timeout: ClientTimeout = ClientTimeout(total=10)
+    batch_window: float = 0.005     # seconds to collect concurrent calls into one batch
+    max_batch_size: int = 20
+
+    def __init__(self, endpoint_uri: str, proxy: str | None = None):
+        super().__init__(endpoint_uri)
+        self.proxy = proxy
+
+        self.batching = RPC_BATCHING
+        self.pending = []
+        self.flush_handle = None
+        self.batch_tasks = set()
+
+
+    async def make_request(self, method, params):
+        if not self.batching:
+            return await self.make_single_request(method, params)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((method, params, future))
+
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.batch_window, self.flush)
+
+        return await future
+
+
+    async def make_single_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        raw_response = await self.post(request_data)
+        return self.decode_rpc_response(raw_response)
+
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        requests, self.pending = self.pending, []
+        if not requests: return
+
+        task = asyncio.create_task(self.send_batch(requests))
+        self.batch_tasks.add(task)
+        task.add_done_callback(self.batch_tasks.discard)
+
+
+    async def send_batch(self, requests: list):
+        if len(requests) == 1:
+            return await self.resolve_single(*requests[0])
+
+        rpc_requests = {}
+        for method, params, future in requests:
+            rpc_requests[next(self.request_counter)] = {"method": method, "params": params or [], "future": future}
+
+        request_data = to_bytes(text=FriendlyJsonSerde().json_encode(
+            [
+                {"jsonrpc": "2.0", "method": request["method"], "params": request["params"], "id": request_id}
+                for request_id, request in rpc_requests.items()
+            ],
+            cls=Web3JsonEncoder,
+        ))
+
+        try:
+            responses = self.decode_rpc_response(await self.post(request_data))
+        except Exception as err:
+            for request in rpc_requests.values():
+                if not request["future"].done(): request["future"].set_exception(err)
+            return
+
+        if not isinstance(responses, list):
+            # endpoint doesnt support batches, dont try again
+            self.batching = False
+            responses = []
+
+        for response in responses:
+            request = rpc_requests.pop(response.get("id"), None) if isinstance(response, dict) else None
+            if request and not request["future"].done():
+                request["future"].set_result(response)
+
+        # everything left without an answer is sent one by one
+        await asyncio.gather(*[
+            self.resolve_single(request["method"], request["params"], request["future"])
+            for request in rpc_requests.values()
+        ])
+
+
+    async def resolve_single(self, method, params, future: asyncio.Future):
+        try:
+            response = await self.make_single_request(method, params)
+            if not future.done(): future.set_result(response)
+        except Exception as err:
+            if not future.done(): future.set_exception(err)
+
+
+    async def post(self, request_data: bytes):
+        session = HttpPool.get_session()
+        async with session.post(
+            self.endpoint_uri,
+            data=request_data,
+            headers=self.get_request_headers(),
+            proxy=self.proxy,
+            timeout=self.timeout,
+        ) as response:
+            response.raise_for_status()
+            return await response.read()
@@ -0,0 +1,146 @@
+from os import path, replace, fsync
+import asyncio
+import json
+
+
+class ReportStore:
+    "in-memory account reports with a group-committed append-only journal"
+
+    flush_interval: float = 2       # seconds between journal flushes
+    flush_size: int = 200           # flush earlier when this many records are buffered
+
+    def __init__(self, snapshot_name: str, journal_name: str):
+        self.snapshot_name = snapshot_name
+        self.journal_name = journal_name
+
+        self.reports = {}
+        self.pending = []
+
+        self.writer = None
+        self.wake_event = None
+        self.stopping = False
+
+        self.load()
+        self.compact()
+
+
+    def load(self):
+        if path.isfile(self.snapshot_name):
+            with open(self.snapshot_name, encoding="utf-8") as f:
+                try: self.reports = json.load(f) or {}
+                except json.JSONDecodeError: self.reports = {}
+
+        if path.isfile(self.journal_name):
+            with open(self.journal_name, encoding="utf-8") as f:
+                for line in f:
+                    try: record = json.loads(line)
+                    except json.JSONDecodeError: break  # torn tail after a crash
+                    self.apply(record)
+
+
+    def apply(self, record: dict):
+        match record["op"]:
+            case "add":
+                if not self.reports.get(record["pk"]): self.reports[record["pk"]] = {'texts': [], 'success_rate': [0, 0]}
+
+                self.reports[record["pk"]]["texts"].append(record["text"])
+                if record["success"] != None:
+                    self.reports[record["pk"]]["success_rate"][1] += 1
+                    if record["success"] == True: self.reports[record["pk"]]["success_rate"][0] += 1
+
+            case "pop":
+                self.reports.pop(record["pk"], None)
+
+            case "clear":
+                self.reports = {}
+
+
+    def record(self, record: dict):
+        self.apply(record)
+        self.pending.append(json.dumps(record, ensure_ascii=False))
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.write_pending()
+            return
+
+        self.start_writer()
+        if len(self.pending) >= self.flush_size:
+            self.wake_event.set()
+
+
+    def add(self, encoded_pk: str, text: str, success: bool = None):
+        self.record({"op": "add", "pk": encoded_pk, "text": text, "success": success})
+
+
+    def get(self, encoded_pk: str):
+        return self.reports.get(encoded_pk)
+
+
+    def pop(self, encoded_pk: str):
+        account_reports = self.reports.get(encoded_pk)
+        if account_reports is not None:
+            self.record({"op": "pop", "pk": encoded_pk})
+        return account_reports
+
+
+    def clear(self):
+        self.record({"op": "clear"})
+
+
+    def write_pending(self):
+        "buffer is swapped in calling thread, with running loop it must be the loop thread"
+        lines, self.pending = self.pending, []
+        self.write_lines(lines)
+
+
+    def write_lines(self, lines: list):
+        if not lines: return
+        with open(self.journal_name, 'a', encoding="utf-8") as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            fsync(f.fileno())
+
+
+    def compact(self):
+        lines, self.pending = self.pending, []
+        self.write_snapshot(snapshot=json.dumps(self.reports), lines=lines)
+
+
+    def write_snapshot(self, snapshot: str, lines: list):
+        self.write_lines(lines)
+
+        with open(self.snapshot_name + '.tmp', 'w', encoding="utf-8") as f: f.write(snapshot)
+        replace(self.snapshot_name + '.tmp', self.snapshot_name)
+        with open(self.journal_name, 'w'): pass
+
+
+    def start_writer(self):
+        if self.writer is not None and not self.writer.done(): return
+
+        self.stopping = False
+        self.wake_event = asyncio.Event()
+        self.writer = asyncio.create_task(self.run_writer())
+
+
+    async def run_writer(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wake_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wake_event.clear()
+            # records are appended by loop thread, so buffer is taken here and only file is written in thread
+            lines, self.pending = self.pending, []
+            await asyncio.to_thread(self.write_lines, lines)
+
+
+    async def close(self):
+        if self.writer is not None and not self.writer.done():
+            self.stopping = True
+            self.wake_event.set()
+            await self.writer
+        self.writer = None
+        lines, self.pending = self.pending, []
+        await asyncio.to_thread(self.write_snapshot, json.dumps(self.reports), lines)
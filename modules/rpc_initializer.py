@@ -1,12 +1,146 @@
 from web3.middleware import async_geth_poa_middleware
-from eth_typing.evm import Address
-from web3 import Web3, AsyncWeb3
-from web3.auto import w3
-from random import choice
+from web3 import AsyncWeb3
+from collections import OrderedDict
+from random import choices
+from loguru import logger
+from time import time
 
+from modules.provider import PooledHTTPProvider
+from modules.utils import make_border
 from settings import RPCS
 
 
+class Endpoint:
+    "one (rpc, proxy) pair with its EWMA latency/error stats and circuit breaker"
+
+    ewma_alpha: float = 0.2
+    fails_to_eject: int = 3
+    eject_time: int = 30             # seconds, doubles for every ejection in a row
+    max_eject_time: int = 300
+    probe_timeout: int = 30          # seconds to wait for a probe request before allowing another one
+    default_latency: float = 0.5
+
+    web3_cache: OrderedDict = OrderedDict()     # built AsyncWeb3 objects, least recently used first
+    web3_cache_size: int = 500
+
+    rate_limit_errors = ["rate limit", "too many requests", "limit exceeded", "exceeded the quota", "capacity exceeded"]
+
+    def __init__(self, chain_name: str, rpc: str, proxy: str | None):
+        self.chain_name = chain_name
+        self.rpc = rpc
+        self.proxy = proxy
+
+        self.latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.selected = 0
+        self.broadcasts_won = 0      # times this endpoint accepted fanned out tx first
+
+        self.fails_in_row = 0
+        self.ejections_in_row = 0
+        self.ejected_until = 0
+        self.probe_started = None
+
+
+    @property
+    def web3(self):
+        "provider is built on first use and kept in a shared LRU cache, stats stay on endpoint after eviction"
+        if self in self.web3_cache:
+            self.web3_cache.move_to_end(self)
+            return self.web3_cache[self]
+
+        web3 = self.build_web3()
+        self.web3_cache[self] = web3
+        if len(self.web3_cache) > self.web3_cache_size:
+            self.web3_cache.popitem(last=False)
+        return web3
+
+
+    def build_web3(self):
+        web3 = AsyncWeb3(PooledHTTPProvider(self.rpc, proxy=self.proxy))
+        # validation sends eth_chainId before every eth_call/eth_estimateGas, chain id is already set from ChainCache
+        web3.middleware_onion.remove("validation")
+        web3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+        web3.middleware_onion.add(self.build_health_middleware(), name="endpoint_health")
+        return web3
+
+
+    def build_health_middleware(self):
+        endpoint = self
+
+        async def health_middleware(make_request, async_w3):
+            async def middleware(method, params):
+                started = time()
+                try:
+                    response = await make_request(method, params)
+                except Exception:
+                    endpoint.record(time() - started, success=False)
+                    raise
+
+                error = response.get("error") if isinstance(response, dict) else None
+                endpoint.record(time() - started, success=not endpoint.is_endpoint_error(error))
+                return response
+            return middleware
+
+        return health_middleware
+
+
+    def is_endpoint_error(self, error):
+        "execution reverts are answers, only throttling is the endpoint fault"
+        if not error: return False
+        error_text = str(error.get("message", error) if isinstance(error, dict) else error).lower()
+        return any(rate_limit_error in error_text for rate_limit_error in self.rate_limit_errors)
+
+
+    def record(self, latency: float, success: bool):
+        self.requests += 1
+        self.error_rate = self.error_rate * (1 - self.ewma_alpha) + (0 if success else self.ewma_alpha)
+
+        if success:
+            self.latency = latency if self.latency is None else self.latency * (1 - self.ewma_alpha) + latency * self.ewma_alpha
+            self.fails_in_row = 0
+            self.ejections_in_row = 0
+            self.ejected_until = 0
+            self.probe_started = None
+            return
+
+        self.errors += 1
+        self.fails_in_row += 1
+        if self.probe_started is not None or self.fails_in_row >= self.fails_to_eject:
+            self.eject()
+
+
+    def eject(self):
+        eject_time = min(self.eject_time * 2 ** self.ejections_in_row, self.max_eject_time)
+        self.ejections_in_row += 1
+        self.ejected_until = time() + eject_time
+        self.fails_in_row = 0
+        self.probe_started = None
+        logger.warning(f'[-] RPC | {self.rpc}{f" ({self.proxy})" if self.proxy else ""} ejected for {eject_time}s')
+
+
+    def is_available(self, now: float):
+        if self.ejected_until == 0:
+            return True
+        if now < self.ejected_until:
+            return False
+        # half-open: let only one probe request through until it succeeds or fails
+        return self.probe_started is None or now - self.probe_started > self.probe_timeout
+
+
+    def mark_selected(self, now: float):
+        self.selected += 1
+        if self.ejected_until and now >= self.ejected_until:
+            self.probe_started = now
+
+
+    @property
+    def weight(self):
+        latency = self.latency if self.latency is not None else self.default_latency
+        return max(1 - self.error_rate, 0.05) ** 2 / max(latency, 0.01)
+
+
 class RPCInitializer:
     connector_list: dict = {}
 
@@ -18,50 +152,108 @@ class RPCInitializer:
     def initialize_rpcs(self, proxies: list | None):
         if self.connector_list: return
 
-        if proxies:
-            self.connector_list["default"] = {
-                chain: [
-                    AsyncWeb3(Web3.AsyncHTTPProvider(
-                        rpc,
-                        request_kwargs={"proxy": proxy},
-                    ))
-                    for proxy in proxies
-                    for rpc in RPCS[chain]
-                ]
-                for chain in RPCS
-            }
-
-        else:
-            for connector_type, rpc_list in [
-                ["default", RPCS],
-            ]:
-                self.connector_list[connector_type] = {
-                    chain: [
-                        AsyncWeb3(Web3.AsyncHTTPProvider(rpc))
-                        for rpc in rpc_list[chain]
-                    ]
-                    for chain in rpc_list
-                }
-
-        for connector_type in self.connector_list:
-            for chain in self.connector_list[connector_type]:
-                for web3 in self.connector_list[connector_type][chain]:
-                    web3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+        self.connector_list["default"] = {
+            chain: [
+                Endpoint(chain_name=chain, rpc=rpc, proxy=proxy)
+                for proxy in (proxies or [None])
+                for rpc in RPCS[chain]
+            ]
+            for chain in RPCS
+        }
+
+
+    @classmethod
+    def select_endpoint(cls, chain_name: str):
+        endpoints = cls.connector_list["default"][chain_name]
+        now = time()
+
+        available = [endpoint for endpoint in endpoints if endpoint.is_available(now)]
+        if not available:
+            # everything is ejected, probe the one which comes back first
+            available = [min(endpoints, key=lambda endpoint: endpoint.ejected_until)]
+
+        endpoint = choices(available, weights=[endpoint.weight for endpoint in available])[0]
+        endpoint.mark_selected(now)
+        return endpoint
+
+
+    @classmethod
+    def select_endpoints(cls, chain_name: str, amount: int):
+        "up to `amount` endpoints with different rpc urls, healthier ones are more likely to be chosen"
+        endpoints = cls.connector_list["default"][chain_name]
+        now = time()
+
+        available = [endpoint for endpoint in endpoints if endpoint.is_available(now)]
+        if not available:
+            available = [min(endpoints, key=lambda endpoint: endpoint.ejected_until)]
+
+        rpc_endpoints = {}
+        for endpoint in available:
+            rpc_endpoints.setdefault(endpoint.rpc, []).append(endpoint)
+        candidates = [
+            choices(same_rpc, weights=[endpoint.weight for endpoint in same_rpc])[0]
+            for same_rpc in rpc_endpoints.values()
+        ]
+
+        selected = []
+        while candidates and len(selected) < amount:
+            endpoint = choices(candidates, weights=[endpoint.weight for endpoint in candidates])[0]
+            candidates.remove(endpoint)
+            endpoint.mark_selected(now)
+            selected.append(endpoint)
+        return selected
 
 
     @classmethod
     def get_rpc(cls, chain_name: str):
-        return choice(cls.connector_list["default"][chain_name])
+        return cls.select_endpoint(chain_name).web3
+
+
+    @classmethod
+    def get_stats(cls):
+        "stats aggregated by rpc url (over all proxies)"
+        stats = {}
+        for chain_name, endpoints in cls.connector_list.get("default", {}).items():
+            for endpoint in endpoints:
+                rpc_stats = stats.setdefault((chain_name, endpoint.rpc), {
+                    "chain": chain_name,
+                    "rpc": endpoint.rpc,
+                    "selected": 0,
+                    "requests": 0,
+                    "errors": 0,
+                    "broadcasts_won": 0,
+                    "latencies": [],
+                    "ejected": 0,
+                })
+                rpc_stats["selected"] += endpoint.selected
+                rpc_stats["requests"] += endpoint.requests
+                rpc_stats["errors"] += endpoint.errors
+                rpc_stats["broadcasts_won"] += endpoint.broadcasts_won
+                if endpoint.latency is not None: rpc_stats["latencies"].append(endpoint.latency)
+                if not endpoint.is_available(time()): rpc_stats["ejected"] += 1
+
+        for rpc_stats in stats.values():
+            latencies = rpc_stats.pop("latencies")
+            rpc_stats["latency"] = round(sum(latencies) / len(latencies) * 1000) if latencies else None
+        return list(stats.values())
 
 
     @classmethod
-    def initialize_contract(
-            cls,
-            chain_name: str,
-            address: str | Address,
-            abi: str
-    ):
-        return cls.get_rpc(chain_name=chain_name).eth.contract(
-            address=w3.to_checksum_address(address),
-            abi=abi,
-        )
+    def log_stats(cls):
+        all_stats = cls.get_stats()
+        chain_requests = {}
+        for rpc_stats in all_stats:
+            chain_requests[rpc_stats["chain"]] = chain_requests.get(rpc_stats["chain"], 0) + rpc_stats["requests"]
+
+        table = {}
+        for rpc_stats in all_stats:
+            if not rpc_stats["requests"]: continue
+            share = round(rpc_stats["requests"] / chain_requests[rpc_stats["chain"]] * 100)
+            table[f'{rpc_stats["chain"]} | {rpc_stats["rpc"]}'] = \
+                f'{share}% of requests | {rpc_stats["latency"]}ms | ' \
+                f'{rpc_stats["errors"]}/{rpc_stats["requests"]} errors | {rpc_stats["ejected"]} ejected | ' \
+                f'{rpc_stats["broadcasts_won"]} first accepted txs'
+
+        if table:
+            logger.info(f'RPC stats:\n{make_border(table)}')
+
@@ -0,0 +1,109 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from heapq import heappush, heappop
+from itertools import count
+import asyncio
+
+from modules.utils import async_sleep
+
+
+class DelayQueue:
+    "one timer task for every parked sleep instead of a sleeping coroutine per account"
+
+    def __init__(self):
+        self.heap = []
+        self.counter = count()
+        self.timer = None
+        self.wake_event = None
+
+
+    async def sleep(self, seconds: float):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        deadline = loop.time() + seconds
+
+        is_first = not self.heap or deadline < self.heap[0][0]
+        heappush(self.heap, (deadline, next(self.counter), future))
+
+        if self.timer is None or self.timer.done():
+            self.wake_event = asyncio.Event()
+            self.timer = asyncio.create_task(self.run_timer())
+        elif is_first:
+            self.wake_event.set()
+
+        await future
+
+
+    async def run_timer(self):
+        loop = asyncio.get_running_loop()
+        while self.heap:
+            deadline, _, future = self.heap[0]
+            delay = deadline - loop.time()
+            if delay > 0:
+                self.wake_event.clear()
+                try: await asyncio.wait_for(self.wake_event.wait(), timeout=delay)
+                except asyncio.TimeoutError: pass
+                continue
+
+            heappop(self.heap)
+            if not future.done():
+                future.set_result(None)
+
+
+class Scheduler:
+    slots: asyncio.Semaphore = None
+    delays: DelayQueue = None
+    holding: ContextVar = ContextVar("holding_slot", default=False)
+    start_lock: asyncio.Lock = None
+    next_start: float = 0
+
+    @classmethod
+    def setup(cls, threads: int):
+        cls.slots = asyncio.Semaphore(threads)
+        cls.delays = DelayQueue()
+        cls.start_lock = asyncio.Lock()
+        cls.next_start = 0
+
+
+    @classmethod
+    async def pace_start(cls, seconds: float):
+        "account starts are spaced by `seconds`, waiting for the start doesnt occupy a thread"
+
+        async with cls.start_lock:
+            loop = asyncio.get_running_loop()
+            if cls.next_start > loop.time():
+                await cls.delays.sleep(cls.next_start - loop.time())
+            cls.next_start = loop.time() + seconds
+
+
+    @classmethod
+    @asynccontextmanager
+    async def slot(cls):
+        await cls.slots.acquire()
+        cls.holding.set(True)
+        try:
+            yield
+        finally:
+            if cls.holding.get():
+                cls.slots.release()
+            cls.holding.set(False)
+
+
+    @classmethod
+    async def park(cls, seconds: float):
+        "sleep without occupying a thread, slot is taken back before continue"
+
+        if seconds <= 0: return
+        if cls.delays is None:
+            return await async_sleep(seconds)
+
+        was_holding = cls.holding.get()
+        if was_holding:
+            cls.holding.set(False)
+            cls.slots.release()
+
+        await cls.delays.sleep(seconds)
+
+        if was_holding:
+            await cls.slots.acquire()
+            cls.holding.set(True)
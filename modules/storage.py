@@ -0,0 +1,203 @@
+from os import path, replace
+from loguru import logger
+import sqlite3
+import json
+
+
+class JsonStorage:
+    "whole-file json storage, kept for compatibility with old databases"
+
+    def __init__(self, db_name: str):
+        self.db_name = db_name
+        self.modules_db = None
+
+        if not path.isfile(self.db_name):
+            with open(self.db_name, 'w') as f: f.write("{}")
+
+
+    def _load(self):
+        if self.modules_db is None:
+            with open(self.db_name, encoding="utf-8") as f: self.modules_db = json.load(f) or {}
+        return self.modules_db
+
+
+    def _dump(self, modules_db: dict):
+        self.modules_db = modules_db
+        with open(self.db_name, 'w', encoding="utf-8") as f: json.dump(modules_db, f)
+
+
+    def first_key(self):
+        return next(iter(self._load()), None)
+
+
+    def replace(self, accounts: dict):
+        self._dump(accounts)
+
+
+    def reset_statuses(self, statuses: list, new_status: str):
+        modules_db = self._load()
+        for acc in modules_db:
+            for index, module in enumerate(modules_db[acc]["modules"]):
+                if module["status"] in statuses: modules_db[acc]["modules"][index]["status"] = new_status
+        self._dump(modules_db)
+
+
+    def amounts(self):
+        modules_db = self._load()
+        return len(modules_db), sum([len(modules_db[acc]["modules"]) for acc in modules_db])
+
+
+    def account_ids(self):
+        return list(self._load())
+
+
+    def account_addresses(self):
+        return {encoded_pk: wallet_data["address"] for encoded_pk, wallet_data in self._load().items()}
+
+
+    def get_account(self, account_id: str):
+        wallet_data = self._load().get(account_id)
+        return (account_id, wallet_data) if wallet_data else None
+
+
+    def delete(self, encoded_pk: str):
+        modules_db = self._load()
+        modules_db.pop(encoded_pk, None)
+        self._dump(modules_db)
+
+
+    def set_status(self, encoded_pk: str, status: str):
+        modules_db = self._load()
+        if modules_db.get(encoded_pk):
+            modules_db[encoded_pk]["modules"] = [
+                {**module, "status": status}
+                for module in modules_db[encoded_pk]["modules"]
+            ]
+            self._dump(modules_db)
+
+
+    def close(self): pass
+
+
+class SQLiteStorage:
+    "one row per account in sqlite (WAL), so every account update touches only its own row"
+
+    def __init__(self, db_name: str, migrate_from: str = None):
+        self.db_name = db_name
+
+        self.conn = sqlite3.connect(self.db_name, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS accounts (
+                encoded_pk  TEXT PRIMARY KEY,
+                address     TEXT NOT NULL,
+                recipient   TEXT,
+                proxy       TEXT,
+                modules     TEXT NOT NULL,
+                status      TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS accounts_address ON accounts(address);
+            CREATE INDEX IF NOT EXISTS accounts_status ON accounts(status);
+        """)
+
+        if migrate_from:
+            self.migrate(migrate_from)
+
+
+    def migrate(self, json_name: str):
+        if not path.isfile(json_name): return
+        if self.conn.execute("SELECT 1 FROM accounts LIMIT 1").fetchone(): return
+
+        with open(json_name, encoding="utf-8") as f: modules_db = json.load(f)
+        if modules_db:
+            self.replace(modules_db)
+            logger.success(f'[+] Database | Migrated {len(modules_db)} accounts from {json_name} to {self.db_name}')
+        replace(json_name, json_name + ".migrated")
+
+
+    @classmethod
+    def _to_row(cls, encoded_pk: str, wallet_data: dict):
+        return (
+            encoded_pk,
+            wallet_data["address"],
+            wallet_data.get("recipient"),
+            wallet_data.get("proxy"),
+            json.dumps([module["module_name"] for module in wallet_data["modules"]]),
+            wallet_data["modules"][0]["status"] if wallet_data["modules"] else "to_run",
+        )
+
+
+    @classmethod
+    def _from_row(cls, row: tuple):
+        encoded_pk, address, recipient, proxy, modules, status = row
+        return encoded_pk, {
+            "address": address,
+            "modules": [{"module_name": module_name, "status": status} for module_name in json.loads(modules)],
+            "recipient": recipient,
+            "proxy": proxy,
+        }
+
+
+    def first_key(self):
+        row = self.conn.execute("SELECT encoded_pk FROM accounts ORDER BY rowid LIMIT 1").fetchone()
+        return row[0] if row else None
+
+
+    def replace(self, accounts: dict):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("DELETE FROM accounts")
+            self.conn.executemany(
+                "INSERT INTO accounts VALUES (?, ?, ?, ?, ?, ?)",
+                [self._to_row(encoded_pk, wallet_data) for encoded_pk, wallet_data in accounts.items()]
+            )
+
+
+    def reset_statuses(self, statuses: list, new_status: str):
+        self.conn.execute(
+            f"UPDATE accounts SET status = ? WHERE status IN ({', '.join('?' * len(statuses))})",
+            [new_status, *statuses]
+        )
+
+
+    def amounts(self):
+        accs_amount, modules_amount = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(json_array_length(modules)), 0) FROM accounts"
+        ).fetchone()
+        return accs_amount, modules_amount
+
+
+    def account_ids(self):
+        return [row[0] for row in self.conn.execute("SELECT rowid FROM accounts ORDER BY rowid")]
+
+
+    def account_addresses(self):
+        return dict(self.conn.execute("SELECT rowid, address FROM accounts"))
+
+
+    def get_account(self, account_id: int):
+        row = self.conn.execute("SELECT * FROM accounts WHERE rowid = ?", (account_id,)).fetchone()
+        return self._from_row(row) if row else None
+
+
+    def delete(self, encoded_pk: str):
+        self.conn.execute("DELETE FROM accounts WHERE encoded_pk = ?", (encoded_pk,))
+
+
+    def set_status(self, encoded_pk: str, status: str):
+        self.conn.execute("UPDATE accounts SET status = ? WHERE encoded_pk = ?", (status, encoded_pk))
+
+
+    def close(self):
+        self.conn.close()
+
+
+def get_storage(engine: str, db_folder: str):
+    match engine:
+        case "json":
+            return JsonStorage(db_name=f"{db_folder}/modules.json")
+        case "sqlite":
+            return SQLiteStorage(db_name=f"{db_folder}/modules.db", migrate_from=f"{db_folder}/modules.json")
+        case _:
+            raise ValueError(f'Unknown database engine "{engine}"')
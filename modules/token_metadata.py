@@ -0,0 +1,97 @@
+from web3.exceptions import BadFunctionCallOutput
+from os import path, replace
+from loguru import logger
+import asyncio
+import json
+
+from modules.multicall import MultiCall
+from modules.abi import AbiRegistry
+import modules.config as config
+
+
+class TokenMetadata:
+    "decimals, symbol and name never change: fetched once per (chain, token) and kept on disk"
+
+    file_name: str = "databases/token_metadata.json"
+    tokens: dict = None         # "chain:address" -> {"decimals", "symbol", "name"}
+    locks: dict = {}            # chain -> asyncio.Lock, one bulk fetch at a time
+
+    @classmethod
+    def load(cls):
+        if cls.tokens is not None: return
+        cls.tokens = {}
+        if path.isfile(cls.file_name):
+            try:
+                with open(cls.file_name) as f:
+                    cls.tokens = json.load(f)
+            except Exception as err:
+                logger.warning(f'[-] TokenMetadata | Couldnt load {cls.file_name}: {err}')
+
+
+    @classmethod
+    def save(cls):
+        if not path.isdir(path.dirname(cls.file_name)): return
+        with open(f"{cls.file_name}.tmp", "w") as f:
+            json.dump(cls.tokens, f, indent=4)
+        replace(f"{cls.file_name}.tmp", cls.file_name)
+
+
+    @classmethod
+    def get_key(cls, chain_name: str, token_address: str):
+        return f'{chain_name}:{token_address.lower()}'
+
+
+    @classmethod
+    async def get(cls, chain_name: str, token_address: str):
+        cls.load()
+        token_key = cls.get_key(chain_name=chain_name, token_address=token_address)
+        if token_key in cls.tokens:
+            return cls.tokens[token_key]
+
+        if chain_name not in cls.locks:
+            cls.locks[chain_name] = asyncio.Lock()
+        async with cls.locks[chain_name]:
+            if token_key not in cls.tokens:
+                await cls.fetch(chain_name=chain_name, token_addresses=[token_address])
+        if token_key not in cls.tokens:
+            raise BadFunctionCallOutput(f'Couldnt get token metadata of {token_address}, probably address is not a token')
+        return cls.tokens[token_key]
+
+
+    @classmethod
+    async def get_decimals(cls, chain_name: str, token_address: str):
+        return (await cls.get(chain_name=chain_name, token_address=token_address))["decimals"]
+
+
+    @classmethod
+    async def fetch(cls, chain_name: str, token_addresses: list):
+        "missed token is fetched in one multicall with every unknown token from config"
+
+        token_addresses = {
+            token_address.lower(): token_address
+            for token_address in [*token_addresses, *config.TOKEN_ADDRESSES.get(chain_name, {}).values()]
+            if cls.get_key(chain_name=chain_name, token_address=token_address) not in cls.tokens
+        }
+
+        call_data = {}
+        for token_address in token_addresses.values():
+            contract = AbiRegistry.contract(chain_name=chain_name, address=token_address, abi_name="erc20")
+            for func in ["decimals", "symbol", "name"]:
+                call_data[f"{token_address}:{func}"] = {"contract": contract, "func": func, "args": []}
+        # failed call is None, so it cant be taken for 0 decimals
+        call_resp = await MultiCall.call(chain_name=chain_name, call_data=call_data, failed_value=None)
+
+        for token_address in token_addresses.values():
+            if (
+                    type(call_resp[f"{token_address}:decimals"]) is not int
+                    or not isinstance(call_resp[f"{token_address}:symbol"], str)
+                    or not isinstance(call_resp[f"{token_address}:name"], str)
+            ):
+                # failed call, probably not a token. nothing is cached so it will be checked again
+                continue
+            cls.tokens[cls.get_key(chain_name=chain_name, token_address=token_address)] = {
+                "decimals": call_resp[f"{token_address}:decimals"],
+                "symbol": call_resp[f"{token_address}:symbol"],
+                "name": call_resp[f"{token_address}:name"],
+            }
+        cls.save()
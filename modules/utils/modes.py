@@ -59,6 +59,7 @@ def choose_mode():
         modes=[
             Mode(soft_id=0, type="", text="(Re)Create Database", is_numeric=False),
             Mode(soft_id=1, type="module", text=f"Claim{claim_info}"),
+            Mode(soft_id=2, type="module", text=f"Arm claims and broadcast at claim start{claim_info}", is_new=True),
         ]
     )
 
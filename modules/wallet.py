@@ -5,22 +5,28 @@ from eth_account.messages import (
 )
 from random import uniform, randint
 from typing import Union, Optional
-from decimal import Decimal
+from math import floor
 from loguru import logger
 from web3.auto import w3
 from time import time
 import asyncio
 
 from modules.rpc_initializer import RPCInitializer
+from modules.chain_cache import ChainCache
+from modules.broadcaster import Broadcaster
+from modules.fee_estimator import FeeEstimator
+from modules.gas_limits import GasLimitCache
+from modules.nonce_manager import NonceManager
+from modules.watchers import ReceiptWatcher, GasWatcher, BalanceWatcher
 from modules.retry import TransactionError, CustomError
-from modules.multicall import MultiCall
+from modules.abi import AbiRegistry
+from modules.token_metadata import TokenMetadata
 from modules.utils import async_sleep
 from modules.database import DataBase
 import modules.config as config
 import settings
 
-from requests.exceptions import HTTPError
-from web3.exceptions import ContractLogicError, BadFunctionCallOutput
+from web3.exceptions import ContractLogicError, BadFunctionCallOutput, TimeExhausted
 
 
 class Wallet:
@@ -34,6 +40,7 @@ class Wallet:
         self.privatekey = privatekey
         self.encoded_pk = encoded_pk
         self.db = db
+        self.sent_txs = {}          # tx hash -> signed tx dict, to replace it with higher fees
 
         self.account = w3.eth.account.from_key(privatekey) if privatekey else None
         self.address = self.account.address if privatekey else None
@@ -47,38 +54,31 @@ class Wallet:
         for chain_data in [
             {'chain_name': 'ethereum', 'max_gwei': settings.ETH_MAX_GWEI},
         ]:
-            first_check = True
-            while True:
+            gas_watcher = GasWatcher.get_watcher(chain_name=chain_data['chain_name'], max_gwei=chain_data['max_gwei'])
+            new_gwei = gas_watcher.gwei
+            if not gas_watcher.is_polling:
                 try:
-                    new_gwei = round((await self.get_web3(chain_name=chain_data['chain_name']).eth.gas_price) / 10 ** 9, 2)
-                    if new_gwei < chain_data["max_gwei"]:
-                        if not first_check:
-                            logger.debug(f'[•] {self.address} | New {chain_data["chain_name"].title()} GWEI is {new_gwei}')
-                        break
-                    await async_sleep(5)
-                    if first_check:
-                        first_check = False
-                        logger.debug(f'[•] {self.address} | Waiting for GWEI in {chain_data["chain_name"].title()} at least {chain_data["max_gwei"]}. Current is {new_gwei}')
+                    new_gwei = await gas_watcher.refresh()
                 except Exception as err:
                     logger.warning(f'[•] {self.address} | {chain_data["chain_name"].title()} gwei waiting error: {err}')
-                    await async_sleep(10)
 
+            if gas_watcher.is_open:
+                continue
 
-    async def get_gas(self, chain_name: str, increasing_gwei: float = 0):
-        web3 = self.get_web3(chain_name=chain_name)
-
-        max_priority, last_block, gas_price = await asyncio.gather(*[
-            web3.eth.max_priority_fee,
-            web3.eth.get_block('latest'),
-            web3.eth.gas_price,
-        ])
+            logger.debug(f'[•] {self.address} | Waiting for GWEI in {chain_data["chain_name"].title()} at least {chain_data["max_gwei"]}. Current is {new_gwei}')
+            new_gwei = await gas_watcher.wait_open()
+            logger.debug(f'[•] {self.address} | New {chain_data["chain_name"].title()} GWEI is {new_gwei}')
 
-        base_fee = int(max(last_block['baseFeePerGas'], gas_price) * (settings.GWEI_MULTIPLIER + increasing_gwei))
-        block_filled = last_block['gasUsed'] / last_block['gasLimit'] * 100
-        if block_filled > 50: base_fee = int(base_fee * 1.127)
 
-        max_fee = int(base_fee + int(max_priority))
-        return {'maxPriorityFeePerGas': max_fee, 'maxFeePerGas': max_fee}
+    async def get_gas(self, chain_name: str, increasing_gwei: float = 0, tx: dict = None, web3=None):
+        "`tx` lets chain estimator price this exact tx (linea_estimateGas)"
+        return await FeeEstimator.estimate(
+            chain_name=chain_name,
+            base_multiplier=settings.GWEI_MULTIPLIER + increasing_gwei,
+            urgency=settings.GAS_URGENCY,
+            tx=tx,
+            web3=web3,
+        )
 
 
     async def sent_tx(
@@ -90,61 +90,112 @@ class Wallet:
             value: int = 0,
             increasing_gwei: float = 0,
             force_gas: float = 0,
+            wait: bool = True,
+            cache_gas: bool = False,        # for txs with constant gas usage: gas limit is learned from receipts instead of estimation
+            gas_params: dict = None,        # fees which are already planned, with `force_gas` tx is sent without any estimation
     ):
+        "with `wait=False` returns tx hash right after broadcast, confirm it later with `wait_for_txs`"
+        tx_completed = {}
         try:
             web3 = self.get_web3(chain_name=chain_name)
-            if not tx_raw:
-                chain_id, nonce, gas_params = await asyncio.gather(*[
-                    web3.eth.chain_id,
-                    web3.eth.get_transaction_count(self.address),
-                    self.get_gas(chain_name=chain_name, increasing_gwei=increasing_gwei),
-                ])
-
-                tx_raw_data = {
-                    'from': self.address,
-                    'chainId': chain_id,
-                    'nonce': nonce,
-                    'value': value,
-                    **gas_params,
-                }
-                if force_gas:
-                    tx_raw_data['gas'] = force_gas
-
-                tx_completed = await tx.build_transaction(tx_raw_data)
-            else:
-                tx_completed = {
-                    **tx,
-                    **await self.get_gas(chain_name=chain_name, increasing_gwei=increasing_gwei),
-                }
-                tx_completed["gas"] = await web3.eth.estimate_gas(tx_completed)
-                if force_gas:
-                    tx_completed["gas"] = force_gas
-
-            signed_tx = web3.eth.account.sign_transaction(tx_completed, self.privatekey)
+            tx_base = {**tx, 'from': self.address, 'value': value} if not tx_raw else {**tx}
+            cached_gas = GasLimitCache.get(chain_name=chain_name, tx=tx_base) if cache_gas else None
+            for attempt in range(2):
+                # same web3 for all reads, so provider sends them as one batch request
+                reads = [
+                    NonceManager.allocate(chain_name=chain_name, address=self.address, web3=web3),
+                    ChainCache.chain_id(chain_name=chain_name, web3=web3),
+                ]
+                if not gas_params:
+                    # known gas limit means tx isnt simulated, so it gets market fees without linea_estimateGas
+                    reads.append(self.get_gas(
+                        chain_name=chain_name,
+                        increasing_gwei=increasing_gwei,
+                        tx=tx_base if not (force_gas or cached_gas) else None,
+                        web3=web3,
+                    ))
+                if cached_gas and not force_gas:
+                    # tx with learned gas limit isnt estimated, cheap eth_call still catches revert before gas is spent
+                    reads.append(web3.eth.call({key: tx_base[key] for key in ["from", "to", "data", "value"] if key in tx_base}))
+                nonce, *read_results = await asyncio.gather(*reads, return_exceptions=True)
+                if isinstance(nonce, Exception):
+                    raise nonce
+                try:
+                    for read_result in read_results:
+                        if isinstance(read_result, Exception): raise read_result
+
+                    tx_completed = {**tx_base, 'nonce': nonce}
+                    if not tx_raw:
+                        tx_completed['chainId'] = read_results[0]
+                    tx_completed.update(gas_params or read_results[1])
+
+                    if force_gas:
+                        tx_completed['gas'] = force_gas
+                    elif cached_gas:
+                        tx_completed['gas'] = cached_gas
+                    elif 'gas' not in tx_completed:
+                        tx_completed['gas'] = await web3.eth.estimate_gas(tx_completed)
+
+                    signed_tx = web3.eth.account.sign_transaction(tx_completed, self.privatekey)
+                    tx_hash = web3.to_hex(signed_tx.hash)
+                    await Broadcaster.send(chain_name=chain_name, raw_tx=signed_tx.rawTransaction)
+                    break
 
-            raw_tx_hash = await web3.eth.send_raw_transaction(signed_tx.rawTransaction)
-            tx_hash = web3.to_hex(raw_tx_hash)
+                except Exception as err:
+                    if "already known" in str(err).lower():
+                        break  # same signed tx is already in mempool
+                    NonceManager.release(chain_name=chain_name, address=self.address, nonce=nonce)
+                    if attempt or not NonceManager.is_nonce_error(err):
+                        raise
+                    logger.warning(f'[-] {self.address} | {tx_label} | nonce {nonce} is outdated, resyncing')
+                    NonceManager.resync(chain_name=chain_name, address=self.address)
+
+            self.sent_txs[tx_hash] = tx_completed
+            logger.debug(f'[•] {self.address} | {tx_label} tx sent: {config.CHAINS_DATA[chain_name]["explorer"]}{tx_hash}')
+            if not wait:
+                return tx_hash
             return await self.wait_for_tx(chain_name, tx_hash, tx_label)
 
         except Exception as err:
-            try: encoded_tx = tx_completed._encode_transaction_data()
-            except: encoded_tx = ''
+            encoded_tx = (tx_completed or tx).get('data', '')
             raise TransactionError(f'tx failed error', error_code=str(err), encoded_tx=encoded_tx)
 
 
     async def wait_for_tx(self, chain_name: str, tx_hash: str, tx_label: str):
-        web3 = self.get_web3(chain_name)
-        tx_link = f'{config.CHAINS_DATA[chain_name]["explorer"]}{tx_hash}'
-        logger.debug(f'[•] {self.address} | {tx_label} tx sent: {tx_link}')
+        "tx pending longer than TO_WAIT_TX is replaced with higher fees, first mined of all replacements is confirmed"
 
-        while True:
-            try:
-                status = (await web3.eth.wait_for_transaction_receipt(tx_hash, timeout=int(settings.TO_WAIT_TX * 60))).status
-                break
+        tx_hashes = [tx_hash]
+        timeout = int(settings.TO_WAIT_TX * 60)
+        bumps = 0
+        try:
+            while True:
+                try:
+                    receipt = await ReceiptWatcher.wait_any(chain_name=chain_name, tx_hashes=tx_hashes, timeout=timeout)
+                    break
+                except TimeExhausted:
+                    last_tx = self.sent_txs.get(tx_hashes[-1])
+                    if not settings.SPEED_UP_TX["enabled"] or last_tx is None or bumps >= settings.SPEED_UP_TX["max_bumps"]:
+                        # tx could be dropped from mempool, next nonce must be read from node
+                        NonceManager.resync(chain_name=chain_name, address=self.address)
+                        raise
+
+                    bumps += 1
+                    timeout = settings.SPEED_UP_TX["every"]
+                    new_hash = await self.speed_up_tx(chain_name=chain_name, tx_completed=last_tx, tx_label=tx_label)
+                    if new_hash and new_hash not in tx_hashes:
+                        tx_hashes.append(new_hash)
+        finally:
+            sent_tx = self.sent_txs.get(tx_hashes[0])
+            for sent_hash in tx_hashes:
+                self.sent_txs.pop(sent_hash, None)
+
+        status = receipt.status
+        tx_hash = w3.to_hex(receipt.transactionHash)
+        tx_link = f'{config.CHAINS_DATA[chain_name]["explorer"]}{tx_hash}'
 
-            except HTTPError as err:
-                logger.error(f'[-] {self.address} | Coudlnt get TX, probably you need to change RPC ({web3.provider.endpoint_uri}): {err}')
-                await async_sleep(5)
+        if sent_tx and sent_tx.get("to"):
+            if status == 1: GasLimitCache.learn(chain_name=chain_name, tx=sent_tx, gas_used=receipt.gasUsed)
+            else: GasLimitCache.invalidate(chain_name=chain_name, tx=sent_tx)
 
         if status == 1:
             logger.success(f'[+] {self.address} | {tx_label} tx confirmed')
@@ -163,6 +214,46 @@ class Wallet:
             raise ValueError(f'tx failed: {tx_link}')
 
 
+    async def speed_up_tx(self, chain_name: str, tx_completed: dict, tx_label: str):
+        "re-sign the same nonce with raised fees, returns hash of replacement"
+
+        bump = max(settings.SPEED_UP_TX["bump"], 1.1)
+        gas_params = await self.get_gas(chain_name=chain_name, tx=tx_completed)
+        gas_params.pop('gas', None)
+        new_tx = {**tx_completed}
+        for fee_key in ["maxFeePerGas", "maxPriorityFeePerGas"]:
+            new_tx[fee_key] = max(int(tx_completed[fee_key] * bump) + 1, gas_params[fee_key])
+        new_tx["maxPriorityFeePerGas"] = min(new_tx["maxPriorityFeePerGas"], new_tx["maxFeePerGas"])
+
+        web3 = self.get_web3(chain_name=chain_name)
+        signed_tx = web3.eth.account.sign_transaction(new_tx, self.privatekey)
+        tx_hash = web3.to_hex(signed_tx.hash)
+        try:
+            await Broadcaster.send(chain_name=chain_name, raw_tx=signed_tx.rawTransaction)
+        except Exception as err:
+            if "already known" not in str(err).lower():
+                # "nonce too low" means one of previous txs is already mined
+                logger.warning(f'[-] {self.address} | {tx_label} speed up error: {err}')
+                return None
+
+        self.sent_txs[tx_hash] = new_tx
+        logger.debug(f'[•] {self.address} | {tx_label} tx sped up ({round(new_tx["maxFeePerGas"] / 10 ** 9, 2)} gwei): '
+                     f'{config.CHAINS_DATA[chain_name]["explorer"]}{tx_hash}')
+        return tx_hash
+
+
+    async def wait_for_txs(self, chain_name: str, txs: dict):
+        "confirm txs sent with `wait=False` together, txs: {tx_hash: tx_label}"
+        results = await asyncio.gather(*[
+            self.wait_for_tx(chain_name=chain_name, tx_hash=tx_hash, tx_label=tx_label)
+            for tx_hash, tx_label in txs.items()
+        ], return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+
     async def approve(
             self,
             chain_name: str,
@@ -170,14 +261,16 @@ class Wallet:
             spender: str,
             amount: float = None,
             value: int = None,
+            wait: bool = True,
+            allowance: int = None,          # already known allowance, not read again
     ):
-        "approve only if not approved"
+        "approve only if not approved, with `wait=False` returns {tx_hash: tx_label} of sent approve"
 
-        token_contract = self.get_web3(chain_name=chain_name).eth.contract(
-            address=config.TOKEN_ADDRESSES[chain_name][token_name],
-            abi='[{"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"address","name":"spender","type":"address"}],"name":"allowance","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"spender","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"}],"name":"approve","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"stateMutability":"view","type":"function"}]',
-        )
-        decimals = await token_contract.functions.decimals().call()
+        token_address = config.TOKEN_ADDRESSES[chain_name][token_name]
+        token_contract = AbiRegistry.contract(chain_name=chain_name, address=token_address, abi_name="erc20")
+        decimals = await TokenMetadata.get_decimals(chain_name=chain_name, token_address=token_address)
+        if allowance is None:
+            allowance = await token_contract.call("allowance", self.address, spender)
 
         if amount:
             value = int(amount * 10 ** decimals)
@@ -190,17 +283,11 @@ class Wallet:
         else:
             min_allowance = value
 
-        if await token_contract.functions.allowance(
-            self.address,
-            spender
-        ).call() < min_allowance:
+        if allowance < min_allowance:
             module_str = f"approve {amount} {token_name}"
-            tx = token_contract.functions.approve(
-                spender,
-                value
-            )
-            await self.sent_tx(chain_name=chain_name, tx=tx, tx_label=module_str)
-            return True
+            tx = token_contract.build_tx("approve", spender, value)
+            tx_hash = await self.sent_tx(chain_name=chain_name, tx=tx, tx_label=module_str, wait=wait)
+            return {tx_hash: module_str} if not wait else True
 
         else:
             return False
@@ -217,10 +304,7 @@ class Wallet:
         web3 = self.get_web3(chain_name=chain_name)
         if token_name: token_address = config.TOKEN_ADDRESSES[chain_name][token_name]
         if token_address:
-            contract = web3.eth.contract(
-                address=web3.to_checksum_address(token_address),
-                abi='[{"inputs":[{"internalType":"address","name":"account","type":"address"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"spender","type":"address"},{"internalType":"uint256","name":"amount","type":"uint256"}],"name":"approve","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"address","name":"spender","type":"address"}],"name":"allowance","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"","type":"address"},{"internalType":"uint256","name":"","type":"uint256"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"}]'
-            )
+            contract = AbiRegistry.contract(chain_name=chain_name, address=token_address, abi_name="erc20")
 
         while True:
             try:
@@ -236,12 +320,12 @@ class Wallet:
                                 params = [self.address, param]
                     else:
                         params = [self.address]
-                    balance = await contract.functions.balanceOf(*params).call()
+                    balance = await contract.call("balanceOf", *params)
                 else: balance = await web3.eth.get_balance(self.address)
 
                 if not human: return balance
 
-                decimals = await contract.functions.decimals().call() if token_address else 18
+                decimals = await TokenMetadata.get_decimals(chain_name=chain_name, token_address=token_address) if token_address else 18
                 return balance / 10 ** decimals
 
             except ContractLogicError:
@@ -279,21 +363,14 @@ class Wallet:
         if token_name and token_name != native_token: token_address = config.TOKEN_ADDRESSES[chain_name][token_name]
         if token_address:
             token_address = web3.to_checksum_address(token_address)
-            contract = web3.eth.contract(
-                address=token_address,
-                abi='[{"inputs":[{"internalType":"address","name":"account","type":"address"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"spender","type":"address"},{"internalType":"uint256","name":"amount","type":"uint256"}],"name":"approve","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"address","name":"spender","type":"address"}],"name":"allowance","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"","type":"address"},{"internalType":"uint256","name":"","type":"uint256"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"symbol","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"}]'
-            )
+            contract = AbiRegistry.contract(chain_name=chain_name, address=token_address, abi_name="erc20")
 
         while True:
             try:
                 if token_address:
-                    call_data = {
-                        "balanceOf": {"contract": contract, "func": "balanceOf", "args": [self.address]},
-                        "decimals": {"contract": contract, "func": "decimals", "args": []},
-                        "symbol": {"contract": contract, "func": "symbol", "args": []},
-                    }
-                    call_resp = await MultiCall.call(chain_name=chain_name, call_data=call_data)
-                    balance, decimals, symbol = call_resp["balanceOf"], call_resp["decimals"], call_resp["symbol"]
+                    token_metadata = await TokenMetadata.get(chain_name=chain_name, token_address=token_address)
+                    balance = await contract.call("balanceOf", self.address)
+                    decimals, symbol = token_metadata["decimals"], token_metadata["symbol"]
 
                 else:
                     balance = await web3.eth.get_balance(self.address)
@@ -332,9 +409,7 @@ class Wallet:
             token_address = config.TOKEN_ADDRESSES[chain_name][token_name]
 
         if token_address:
-            contract = self.get_web3(chain_name=chain_name).eth.contract(address=w3.to_checksum_address(token_address),
-                                         abi='[{"inputs":[{"internalType":"address","name":"account","type":"address"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"spender","type":"address"},{"internalType":"uint256","name":"amount","type":"uint256"}],"name":"approve","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"address","name":"spender","type":"address"}],"name":"allowance","outputs":[{"internalType":"uint256","name":"","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"name","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"}]')
-            token_name = await contract.functions.name().call()
+            token_name = (await TokenMetadata.get(chain_name=chain_name, token_address=token_address))["name"]
 
         else:
             token_name = 'ETH'
@@ -343,22 +418,31 @@ class Wallet:
         else: logger.debug(f'[•] {self.address} | Waiting for {round(needed_balance, 6)} {token_name} balance in {chain_name.upper()}')
         start_time = time()
 
-        while True:
-            try:
-                new_balance = await self.get_balance(chain_name=chain_name, human=human, token_address=token_address)
-
-                if only_more: status = new_balance > needed_balance
-                else: status = new_balance >= needed_balance
-                if status:
-                    logger.debug(f'[•] {self.address} | New balance: {round(new_balance, 6)} {token_name}')
-                    return new_balance
-                if timeout and time() - start_time > timeout:
-                    logger.error(f'[-] {self.address} | No token found in {timeout} seconds')
-                    return 0
-                await async_sleep(5)
-            except Exception as err:
-                logger.warning(f'[•] {self.address} | Wait balance error: {err}')
-                await async_sleep(10)
+        # balance is read again only when BalanceWatcher sees transfer to this wallet, or every minute just in case
+        transfer_event = BalanceWatcher.subscribe(chain_name=chain_name, address=self.address, token_address=token_address or None)
+        try:
+            while True:
+                try:
+                    transfer_event.clear()
+                    new_balance = await self.get_balance(chain_name=chain_name, human=human, token_address=token_address)
+
+                    if only_more: status = new_balance > needed_balance
+                    else: status = new_balance >= needed_balance
+                    if status:
+                        logger.debug(f'[•] {self.address} | New balance: {round(new_balance, 6)} {token_name}')
+                        return new_balance
+                    if timeout and time() - start_time > timeout:
+                        logger.error(f'[-] {self.address} | No token found in {timeout} seconds')
+                        return 0
+
+                    wait_time = 60 if not timeout else max(min(60, timeout - (time() - start_time)), 1)
+                    try: await asyncio.wait_for(transfer_event.wait(), timeout=wait_time)
+                    except asyncio.TimeoutError: pass
+                except Exception as err:
+                    logger.warning(f'[•] {self.address} | Wait balance error: {err}')
+                    await async_sleep(10)
+        finally:
+            BalanceWatcher.unsubscribe(chain_name=chain_name, address=self.address, token_address=token_address or None, event=transfer_event)
 
 
     def sign_message(
@@ -381,58 +465,70 @@ class Wallet:
 
 
     async def transfer_token(self, chain_name: str, token_name: str, value: int):
-        token_contract = RPCInitializer.initialize_contract(
-            chain_name=chain_name,
-            address=config.TOKEN_ADDRESSES[chain_name][token_name],
-            abi='[{"inputs":[],"name":"decimals","outputs":[{"internalType":"uint8","name":"","type":"uint8"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"value","type":"uint256"}],"name":"transfer","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"nonpayable","type":"function"}]',
-        )
-        decimals = await token_contract.functions.decimals().call()
+        token_address = config.TOKEN_ADDRESSES[chain_name][token_name]
+        token_contract = AbiRegistry.contract(chain_name=chain_name, address=token_address, abi_name="erc20")
+        decimals = await TokenMetadata.get_decimals(chain_name=chain_name, token_address=token_address)
         amount = round(value / 10 ** decimals, 5)
 
         module_str = f"transfer {amount} {token_name}"
-        tx = token_contract.functions.transfer(
-            self.recipient,
-            value
-        )
+        tx = token_contract.build_tx("transfer", self.recipient, value)
         await self.sent_tx(chain_name=chain_name, tx=tx, tx_label=module_str)
         return True
 
 
-    async def transfer_native(self, chain_name: str, decrease: float = 0):
-        keep_amounts = settings.AFTER_CLAIM["keep_eth"]
-        native_amount = await self.get_balance(chain_name=chain_name, human=True) - decrease
+    async def transfer_native(self, chain_name: str, balance: int = None):
+        "exact sweep: balance - keep amount - max gas cost of tx and its speed ups, planned in one pass. `balance` if it is already known"
+
+        keep_amounts = list(settings.AFTER_CLAIM["keep_eth"])
+        web3 = self.get_web3(chain_name=chain_name)
+        if balance is None:
+            balance = await self.get_balance(chain_name=chain_name)
+        chain_id = await ChainCache.chain_id(chain_name=chain_name)
+        tx = {
+            'from': self.address,
+            'to': self.recipient,
+            'value': 0,
+            'chainId': chain_id,
+        }
+
+        # on linea fees and gas limit (with L1 data cost) come from one linea_estimateGas. linea fee depends on tx content,
+        # so it is priced with value of the same size as the final one: it cant be bigger than balance - minimal keep amount
+        estimate_tx = {**tx, 'value': max(balance - int(keep_amounts[0] * 1e18), 0)}
+        gas_params = await self.get_gas(chain_name=chain_name, tx=estimate_tx)
+        gas_limit = gas_params.pop('gas', None) or await web3.eth.estimate_gas(estimate_tx)
+        # replacements from speed_up_tx raise max fee, they must fit into balance too
+        if settings.SPEED_UP_TX["enabled"]:
+            max_bumps = settings.SPEED_UP_TX["max_bumps"]
+            max_fee = int(gas_params['maxFeePerGas'] * max(settings.SPEED_UP_TX["bump"], 1.1) ** max_bumps) + max_bumps
+        else:
+            max_fee = gas_params['maxFeePerGas']
+        max_gas_cost = gas_limit * max_fee
+
+        native_amount = (balance - max_gas_cost) / 1e18
         if native_amount < keep_amounts[0]:
-            raise CustomError(f"Not enough ETH ({round(native_amount, 5)}) for minimal keep ETH balance ({keep_amounts[0]})")
+            raise CustomError(f"Not enough ETH ({round(balance / 1e18, 5)}) for minimal keep ETH balance ({keep_amounts[0]}) and gas")
 
         if keep_amounts[1] > native_amount:
             keep_amounts[1] = native_amount
         keep_amount = uniform(*keep_amounts)
-        transfer_amount = round(native_amount - keep_amount, randint(5, 7))
-        transfer_value = int(transfer_amount * 1e18)
+        precision = randint(5, 7)
+        transfer_value = int(floor((native_amount - keep_amount) * 10 ** precision) * 10 ** (18 - precision))
+        if transfer_value <= 0:
+            raise CustomError(f"Nothing to transfer after keeping {round(keep_amount, 6)} ETH and {round(max_gas_cost / 1e18, 6)} ETH for gas")
+
         amount = round(transfer_value / 1e18, 5)
         tx_label = f"transfer {amount} ETH"
 
-        web3 = self.get_web3(chain_name=chain_name)
-        tx = {
-            'from': self.address,
-            'to': self.recipient,
-            "value": transfer_value,
-            'chainId': await web3.eth.chain_id,
-            'nonce': await web3.eth.get_transaction_count(self.address),
-        }
-
         try:
             await self.sent_tx(
                 chain_name=chain_name,
-                tx=tx,
+                tx={**tx, 'value': transfer_value},
                 tx_label=tx_label,
-                tx_raw=True
+                tx_raw=True,
+                force_gas=gas_limit,
+                gas_params=gas_params,
             )
         except Exception as err:
-            if "insufficient funds for transfer" in str(err) or "gas required exceeds allowance" in str(err):
-                logger.warning(f'[-] {self.address} | {tx_label} | insufficient funds, recalculating... (-{str(round(Decimal(decrease + 0.00001), 5))})')
-                return await self.transfer_native(chain_name=chain_name, decrease=decrease + 0.00001)
-            else:
-                raise CustomError(f"Failed to {tx_label}: {err}")
+            raise CustomError(f"Failed to {tx_label}: {err}")
 
         return True
@@ -0,0 +1,273 @@
+from web3.exceptions import TransactionNotFound, TimeExhausted
+from web3.auto import w3
+from loguru import logger
+import asyncio
+
+from modules.rpc_initializer import RPCInitializer
+from modules.chain_cache import ChainCache
+from modules.multicall import MultiCall
+from modules.abi import AbiRegistry
+
+
+class ReceiptWatcher:
+    "one per chain: follows new blocks and fetches receipts of all pending txs once per block"
+
+    watchers: dict = {}
+
+    def __init__(self, chain_name: str):
+        self.chain_name = chain_name
+        self.pending = {}           # tx hash -> set of futures waiting for it
+        self.last_block = None
+        self.task = None
+
+
+    @classmethod
+    def get_watcher(cls, chain_name: str):
+        if chain_name not in cls.watchers:
+            cls.watchers[chain_name] = cls(chain_name=chain_name)
+        return cls.watchers[chain_name]
+
+
+    @classmethod
+    async def wait_any(cls, chain_name: str, tx_hashes: list, timeout: float):
+        "receipt of the first mined tx from `tx_hashes`, raises TimeExhausted after `timeout` seconds"
+
+        watcher = cls.get_watcher(chain_name)
+        future = asyncio.get_running_loop().create_future()
+        tx_hashes = [tx_hash.lower() for tx_hash in tx_hashes]
+        for tx_hash in tx_hashes:
+            watcher.pending.setdefault(tx_hash, set()).add(future)
+        watcher.start()
+
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise TimeExhausted(f'Transaction {tx_hashes[-1]} is not in the chain after {timeout} seconds')
+        finally:
+            for tx_hash in tx_hashes:
+                waiters = watcher.pending.get(tx_hash)
+                if waiters is None: continue
+                waiters.discard(future)
+                if not waiters: watcher.pending.pop(tx_hash, None)
+
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+
+    async def run(self):
+        poll_interval = ChainCache.block_time(self.chain_name) / 2
+        while self.pending:
+            try:
+                block_number = await ChainCache.block_number(chain_name=self.chain_name)
+                if block_number != self.last_block:
+                    await self.check_receipts()
+                    self.last_block = block_number
+            except Exception as err:
+                logger.warning(f'[-] ReceiptWatcher | {self.chain_name.title()} receipts check error: {err}')
+            await asyncio.sleep(poll_interval)
+
+
+    async def check_receipts(self):
+        # all requests go to one endpoint at once, provider packs them into one batch
+        web3 = RPCInitializer.get_rpc(self.chain_name)
+        tx_hashes = list(self.pending)
+        receipts = await asyncio.gather(*[
+            web3.eth.get_transaction_receipt(tx_hash)
+            for tx_hash in tx_hashes
+        ], return_exceptions=True)
+
+        errors = []
+        for tx_hash, receipt in zip(tx_hashes, receipts):
+            if isinstance(receipt, TransactionNotFound) or receipt is None:
+                continue
+            if isinstance(receipt, Exception):
+                errors.append(receipt)
+                continue
+
+            for future in self.pending.pop(tx_hash, set()):
+                if not future.done(): future.set_result(receipt)
+
+        if errors:
+            # block is checked again on the next poll
+            raise errors[0]
+
+
+class GasWatcher:
+    "one per (chain, gwei limit): polls gas price only while wallets wait for it and wakes them all at once"
+
+    watchers: dict = {}
+    poll_interval: int = 5
+    hysteresis: float = 0.05        # closed gate opens only when gwei is 5% under the limit
+
+    def __init__(self, chain_name: str, max_gwei: float):
+        self.chain_name = chain_name
+        self.max_gwei = max_gwei
+
+        self.gwei = None
+        self.is_open = None
+        self.opened = asyncio.Event()
+        self.waiters = 0
+        self.task = None
+
+
+    @classmethod
+    def get_watcher(cls, chain_name: str, max_gwei: float):
+        if (chain_name, max_gwei) not in cls.watchers:
+            cls.watchers[(chain_name, max_gwei)] = cls(chain_name=chain_name, max_gwei=max_gwei)
+        return cls.watchers[(chain_name, max_gwei)]
+
+
+    @property
+    def is_polling(self):
+        "while watcher polls, published gwei is fresh enough"
+        return self.task is not None and not self.task.done()
+
+
+    async def refresh(self):
+        self.update(round((await ChainCache.gas_price(chain_name=self.chain_name)) / 10 ** 9, 2))
+        return self.gwei
+
+
+    def update(self, gwei: float):
+        self.gwei = gwei
+        if gwei >= self.max_gwei:
+            self.is_open = False
+            self.opened.clear()
+        elif self.is_open is None or gwei < self.max_gwei * (1 - self.hysteresis):
+            self.is_open = True
+            self.opened.set()
+
+
+    async def wait_open(self):
+        "returns gwei once gate is open"
+        self.waiters += 1
+        try:
+            if not self.is_polling:
+                self.task = asyncio.create_task(self.run())
+            while not self.is_open:
+                await self.opened.wait()
+            return self.gwei
+        finally:
+            self.waiters -= 1
+
+
+    async def run(self):
+        while self.waiters:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception as err:
+                logger.warning(f'[•] GasWatcher | {self.chain_name.title()} gwei waiting error: {err}')
+
+
+class BalanceWatcher:
+    "one per chain: follows Transfer logs to tracked addresses and native balances, wakes wallets waiting for balance"
+
+    watchers: dict = {}
+    transfer_topic: str = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+    max_blocks_range: int = 1000
+
+    def __init__(self, chain_name: str):
+        self.chain_name = chain_name
+        self.waiters = {}           # (token address or None for native, address) -> set of asyncio.Event
+        self.native_balances = {}   # address -> last seen native balance
+        self.last_block = None
+        self.task = None
+
+
+    @classmethod
+    def get_watcher(cls, chain_name: str):
+        if chain_name not in cls.watchers:
+            cls.watchers[chain_name] = cls(chain_name=chain_name)
+        return cls.watchers[chain_name]
+
+
+    @classmethod
+    def subscribe(cls, chain_name: str, address: str, token_address: str | None):
+        "subscribe before reading balance, so transfer between read and wait isnt missed"
+        watcher = cls.get_watcher(chain_name)
+        event = asyncio.Event()
+        watcher.waiters.setdefault(watcher.get_key(address, token_address), set()).add(event)
+        watcher.start()
+        return event
+
+
+    @classmethod
+    def unsubscribe(cls, chain_name: str, address: str, token_address: str | None, event: asyncio.Event):
+        watcher = cls.get_watcher(chain_name)
+        key = watcher.get_key(address, token_address)
+        waiters = watcher.waiters.get(key, set())
+        waiters.discard(event)
+        if not waiters:
+            watcher.waiters.pop(key, None)
+            if key[0] is None: watcher.native_balances.pop(key[1], None)
+
+
+    @staticmethod
+    def get_key(address: str, token_address: str | None):
+        return (token_address.lower() if token_address else None, address.lower())
+
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+
+    async def run(self):
+        poll_interval = ChainCache.block_time(self.chain_name) / 2
+        while self.waiters:
+            try:
+                block_number = await ChainCache.block_number(chain_name=self.chain_name)
+                if self.last_block is None:
+                    self.last_block = block_number - 1
+                if block_number > self.last_block:
+                    await asyncio.gather(*[
+                        self.check_transfers(from_block=max(self.last_block + 1, block_number - self.max_blocks_range), to_block=block_number),
+                        self.check_native_balances(),
+                    ])
+                    self.last_block = block_number
+            except Exception as err:
+                logger.warning(f'[-] BalanceWatcher | {self.chain_name.title()} balances check error: {err}')
+            await asyncio.sleep(poll_interval)
+        self.last_block = None
+
+
+    def wake(self, key: tuple):
+        for event in self.waiters.get(key, set()):
+            event.set()
+
+
+    async def check_transfers(self, from_block: int, to_block: int):
+        token_keys = [key for key in self.waiters if key[0] is not None]
+        if not token_keys: return
+
+        logs = await RPCInitializer.get_rpc(self.chain_name).eth.get_logs({
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "address": [w3.to_checksum_address(token_address) for token_address in {key[0] for key in token_keys}],
+            "topics": [
+                self.transfer_topic,
+                None,
+                ["0x" + address.removeprefix("0x").rjust(64, "0") for address in {key[1] for key in token_keys}],
+            ],
+        })
+        for log in logs:
+            recipient = "0x" + bytes(log["topics"][2])[-20:].hex()
+            self.wake((log["address"].lower(), recipient))
+
+
+    async def check_native_balances(self):
+        addresses = list({key[1] for key in self.waiters if key[0] is None})
+        if not addresses: return
+
+        multicall_contract = AbiRegistry.contract(chain_name=self.chain_name, address=MultiCall.multicall_address, abi_name="multicall3")
+        balances = await MultiCall.call(chain_name=self.chain_name, call_data={
+            address: {"contract": multicall_contract, "func": "getEthBalance", "args": [w3.to_checksum_address(address)]}
+            for address in addresses
+        })
+        for address, balance in balances.items():
+            if address in self.native_balances and self.native_balances[address] != balance:
+                self.wake((None, address))
+            self.native_balances[address] = balance
@@ -4,7 +4,14 @@ RETRY               = 3
 
 ETH_MAX_GWEI        = 25
 GWEI_MULTIPLIER     = 1.5                               # умножать текущий гвей при отправке транз на 50%
+GAS_URGENCY         = "normal"                          # slow | normal | fast - какой чай (priority fee) платить: 10 / 50 / 90 перцентиль последних блоков (в linea не ниже чем требует linea_estimateGas)
 TO_WAIT_TX          = 1                                 # сколько минут ожидать транзакцию. если транза будет находится в пендинге после указанного времени то будет считатся зафейленной
+SPEED_UP_TX         = {
+    "enabled"       : True,                             # True | False - если транза висит дольше TO_WAIT_TX - переподписать её с тем же nonce и повышенным газом
+    "bump"          : 1.15,                             # во сколько раз повышать газ при каждой замене (минимум 1.1)
+    "every"         : 60,                               # через сколько секунд повышать газ снова, если замена тоже висит
+    "max_bumps"     : 3,                                # сколько раз повышать газ прежде чем считать транзу зафейленной
+}
 
 RPCS                = {
     'ethereum'      : [
@@ -21,8 +28,12 @@ RPCS                = {
         "https://linea-rpc.publicnode.com",
     ],
 }
+BROADCAST_RPCS      = 3                                 # в сколько разных RPC одновременно отправлять каждую транзакцию (1 - только в одну)
+RPC_BATCHING        = True                              # True | False - объединять одновременные запросы к одной RPC в один JSON-RPC batch
 
 # --- CLAIM SETTINGS ---
+PRESCAN_ACCOUNTS    = True                              # True | False - перед запуском проверить все кошельки пачками через multicall и пропустить тех, кому нечего делать
+ARM_MAX_WAIT        = 24                                # сколько часов режим arm ждёт старта клейма, после этого кошельки клеймят как обычно
 AFTER_CLAIM         = {
     "swap"          : False,                            # после клейма $LINEA - свапать его в ETH на Odos
     "slippage"      : 5,                                # проскальзывание для свапа на ODOS
@@ -35,10 +46,12 @@ AFTER_CLAIM         = {
 
 
 SLEEP_AFTER_TX      = [5, 10]                           # задержка после каждой транзакции
-SLEEP_AFTER_ACCOUNT = [30, 60]                          # задержка после каждого аккаунта
+SLEEP_AFTER_ACCOUNT = [30, 60]                          # задержка между запусками аккаунтов (делится на THREADS)
 
 # --- GENERAL SETTINGS ---
 THREADS             = 1                                 # количество потоков (одновременно работающих кошельков)
+MAX_PARKED_ACCOUNTS = 10                                # сколько аккаунтов могут ждать SLEEP_AFTER_TX не занимая поток
+DATABASE_ENGINE     = "sqlite"                          # sqlite | json - где хранить базу аккаунтов. старая modules.json будет перенесена в sqlite автоматически
 
 
 # --- PERSONAL SETTINGS ---